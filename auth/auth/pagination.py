@@ -0,0 +1,136 @@
+import base64
+import binascii
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+class KeysetPagination(BasePagination):
+    ordering_field = 'created'
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'limit'
+    chronological = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        before = self.decode_cursor(queryset.model, request.query_params.get('before'))
+        after = self.decode_cursor(queryset.model, request.query_params.get('after'))
+        return self.paginate(queryset, self.get_limit(request), before=before, after=after)
+
+    def paginate(self, queryset, limit, before=None, after=None):
+        self.limit = limit
+        field = self.ordering_field
+        if after:
+            value, pk = after
+            queryset = queryset.filter(Q(**{f'{field}__gte': value}) & (Q(**{f'{field}__gt': value}) | Q(id__gt=pk))).order_by(field, 'id')
+        else:
+            if before:
+                value, pk = before
+                queryset = queryset.filter(Q(**{f'{field}__lte': value}) & (Q(**{f'{field}__lt': value}) | Q(id__lt=pk)))
+            queryset = queryset.order_by(f'-{field}', '-id')
+        page = list(queryset[:self.limit + 1])
+        self.has_more = len(page) > self.limit
+        page = page[:self.limit]
+        if not page:
+            self.oldest = self.newest = None
+        elif after:
+            self.oldest, self.newest = page[0], page[-1]
+        else:
+            self.oldest, self.newest = page[-1], page[0]
+        if bool(after) != self.chronological:
+            page.reverse()
+        return page
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return min(max(limit, 1), self.max_page_size)
+
+    def encode_cursor(self, obj):
+        if obj is None:
+            return None
+        value = getattr(obj, self.ordering_field)
+        value = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+        return base64.urlsafe_b64encode(f'{value}|{obj.pk}'.encode()).decode()
+
+    def decode_cursor(self, model, cursor):
+        if not cursor:
+            return None
+        try:
+            value, pk = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+            value = model._meta.get_field(self.ordering_field).to_python(value)
+            return value, int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError, DjangoValidationError):
+            raise ValidationError({'cursor': ['Invalid pagination cursor']})
+
+    def get_cursors(self):
+        return {'has_more': self.has_more, 'before': self.encode_cursor(self.oldest), 'after': self.encode_cursor(self.newest)}
+
+    def get_paginated_response(self, data):
+        return Response({**self.get_cursors(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'has_more': {'type': 'boolean'},
+                'before': {'type': 'string', 'nullable': True, 'description': 'Cursor for items older than this page'},
+                'after': {'type': 'string', 'nullable': True, 'description': 'Cursor for items newer than this page'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': 'before', 'required': False, 'in': 'query', 'description': 'Return items older than this cursor', 'schema': {'type': 'string'}},
+            {'name': 'after', 'required': False, 'in': 'query', 'description': 'Return items newer than this cursor', 'schema': {'type': 'string'}},
+            {'name': self.page_size_query_param, 'required': False, 'in': 'query', 'description': f'Page size (max {self.max_page_size})', 'schema': {'type': 'integer'}},
+        ]
+
+class RankedSearchPagination(KeysetPagination):
+    def paginate_search(self, search, request):
+        self.limit = self.get_limit(request)
+        after = self.decode_rank_cursor(request.query_params.get('after'))
+        page = search(limit=self.limit + 1, after=after)
+        self.has_more = len(page) > self.limit
+        page = page[:self.limit]
+        self.last = page[-1] if self.has_more else None
+        return page
+
+    def encode_cursor(self, obj):
+        if obj is None:
+            return None
+        return base64.urlsafe_b64encode(f'{obj.rank!r}|{obj.pk}'.encode()).decode()
+
+    def decode_rank_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            rank, pk = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+            return float(rank), int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise ValidationError({'cursor': ['Invalid pagination cursor']})
+
+    def get_cursors(self):
+        return {'has_more': self.has_more, 'after': self.encode_cursor(self.last)}
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'has_more': {'type': 'boolean'},
+                'after': {'type': 'string', 'nullable': True, 'description': 'Cursor for the next, lower-ranked page'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': 'after', 'required': False, 'in': 'query', 'description': 'Return results ranked below this cursor', 'schema': {'type': 'string'}},
+            {'name': self.page_size_query_param, 'required': False, 'in': 'query', 'description': f'Page size (max {self.max_page_size})', 'schema': {'type': 'integer'}},
+        ]
@@ -0,0 +1,19 @@
+from django.db import connection, transaction
+
+def reserve_ids(model, count=1):
+    table = model._meta.db_table
+    column = model._meta.pk.column
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)", [table, column, count])
+            return [row[0] for row in cursor.fetchall()]
+        if connection.vendor != 'sqlite':
+            return None
+        with transaction.atomic():
+            cursor.execute("UPDATE sqlite_sequence SET seq = seq + %s WHERE name = %s RETURNING seq", [count, table])
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute(f'SELECT COALESCE(MAX("{column}"), 0) + %s FROM {table}', [count])
+                row = cursor.fetchone()
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, row[0]])
+        return list(range(row[0] - count + 1, row[0] + 1))
@@ -38,6 +38,7 @@ INSTALLED_APPS = ['channels',
                   'Itinerary.apps.ItineraryConfig',
                   'tripmate.apps.TripmateConfig',
                   'trending.apps.TrendingConfig',
+                  'imaging.apps.ImagingConfig',
                 ]
 
 MIDDLEWARE = ['django.middleware.security.SecurityMiddleware', 'whitenoise.middleware.WhiteNoiseMiddleware', 'django.contrib.sessions.middleware.SessionMiddleware', 'corsheaders.middleware.CorsMiddleware', 'django.middleware.common.CommonMiddleware', 'django.middleware.csrf.CsrfViewMiddleware', 'django.contrib.auth.middleware.AuthenticationMiddleware', 'django.contrib.messages.middleware.MessageMiddleware', 'django.middleware.clickjacking.XFrameOptionsMiddleware']
@@ -62,6 +63,30 @@ CHANNEL_LAYERS = {
     },
 }
 
+CHAT_MESSAGE_PERSISTENCE = config('CHAT_MESSAGE_PERSISTENCE', default='immediate')
+CHAT_BATCH_FLUSH_INTERVAL_MS = config('CHAT_BATCH_FLUSH_INTERVAL_MS', default=50, cast=int)
+CHAT_BATCH_MAX_SIZE = config('CHAT_BATCH_MAX_SIZE', default=200, cast=int)
+CHAT_BATCH_MAX_RETRIES = config('CHAT_BATCH_MAX_RETRIES', default=3, cast=int)
+CHAT_BATCH_SPILL_PATH = config('CHAT_BATCH_SPILL_PATH', default=str(BASE_DIR / 'chat_spill.jsonl'))
+CHAT_READ_RECEIPT_INTERVAL_MS = config('CHAT_READ_RECEIPT_INTERVAL_MS', default=1000, cast=int)
+CHAT_PRESENCE_TTL = config('CHAT_PRESENCE_TTL', default=60, cast=int)
+CHAT_REPLAY_BATCH_SIZE = config('CHAT_REPLAY_BATCH_SIZE', default=100, cast=int)
+CHAT_REPLAY_MAX_MESSAGES = config('CHAT_REPLAY_MAX_MESSAGES', default=1000, cast=int)
+CHAT_TYPING_TIMEOUT = config('CHAT_TYPING_TIMEOUT', default=5, cast=int)
+CHAT_TYPING_ROOM_RATE = config('CHAT_TYPING_ROOM_RATE', default=5, cast=float)
+CHAT_TYPING_ROOM_BURST = config('CHAT_TYPING_ROOM_BURST', default=10, cast=int)
+CHAT_METRICS_FLUSH_INTERVAL = config('CHAT_METRICS_FLUSH_INTERVAL', default=10, cast=int)
+CHAT_RATE_LIMITS = {
+    'chat_message': (config('CHAT_MESSAGE_RATE', default=2, cast=float), config('CHAT_MESSAGE_BURST', default=20, cast=int)),
+    'typing': (config('CHAT_TYPING_RATE', default=2, cast=float), config('CHAT_TYPING_BURST', default=10, cast=int)),
+    'read_receipt': (config('CHAT_READ_RECEIPT_RATE', default=5, cast=float), config('CHAT_READ_RECEIPT_BURST', default=20, cast=int)),
+    'sync': (config('CHAT_SYNC_RATE', default=0.5, cast=float), config('CHAT_SYNC_BURST', default=5, cast=int)),
+    'subscribe': (config('CHAT_SUBSCRIBE_RATE', default=5, cast=float), config('CHAT_SUBSCRIBE_BURST', default=50, cast=int)),
+}
+CHAT_PARTITIONS_AHEAD = config('CHAT_PARTITIONS_AHEAD', default=3, cast=int)
+CHAT_ARCHIVE_AFTER_MONTHS = config('CHAT_ARCHIVE_AFTER_MONTHS', default=12, cast=int)
+IMAGE_WORKERS = config('IMAGE_WORKERS', default=2, cast=int)
+
 database_url = os.environ.get("DATABASE_URL")
 if database_url:
     if database_url.startswith("postgres://"):
@@ -70,6 +95,8 @@ if database_url:
 else:
     DATABASES = {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'db.sqlite3'}}
 
+CHAT_DB_THREADS = config('CHAT_DB_THREADS', default=1 if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3' else 8, cast=int)
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': ('rest_framework_simplejwt.authentication.JWTAuthentication',),
     'DEFAULT_SCHEMA_CLASS':'drf_spectacular.openapi.AutoSchema',
@@ -89,8 +116,12 @@ USE_TZ = True
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-DATA_UPLOAD_MAX_MEMORY_SIZE = 1048576000
-FILE_UPLOAD_MAX_MEMORY_SIZE = 1048576000
+DATA_UPLOAD_MAX_MEMORY_SIZE = 2621440
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440
+CHUNKED_UPLOAD_DIR = config('CHUNKED_UPLOAD_DIR', default=str(BASE_DIR / 'uploads'))
+CHUNKED_UPLOAD_CHUNK_SIZE = config('CHUNKED_UPLOAD_CHUNK_SIZE', default=5242880, cast=int)
+CHUNKED_UPLOAD_EXPIRY_HOURS = config('CHUNKED_UPLOAD_EXPIRY_HOURS', default=24, cast=int)
+COMMUNITY_HOT_WINDOW_HOURS = config('COMMUNITY_HOT_WINDOW_HOURS', default=168, cast=int)
 
 AUTH_USER_MODEL = 'account.User'
 
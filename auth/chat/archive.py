@@ -0,0 +1,107 @@
+import gzip
+import json
+import logging
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+from account.models import User
+from .models import Message, MessageArchive
+from .partitions import attach_partition, data_columns, detach_partition, drop_partition, partition_name
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_PREFIX = 'chat/archive'
+
+def archive_path(month, conversation_id):
+    return f'{ARCHIVE_PREFIX}/{month:%Y-%m}/{conversation_id}.jsonl.gz'
+
+def encode_row(columns, row):
+    record = dict(zip(columns, row))
+    for key in ('timestamp', 'edited_at'):
+        if record[key] is not None:
+            record[key] = record[key].isoformat()
+    return json.dumps(record)
+
+def upload_archive(month, conversation_id, lines, first, last):
+    path = default_storage.save(archive_path(month, conversation_id), ContentFile(gzip.compress('\n'.join(lines).encode())))
+    return MessageArchive(conversation_id=conversation_id, month=month, path=path, message_count=len(lines), first_timestamp=first, last_timestamp=last)
+
+def archive_partition(month):
+    columns = [field.column for field in Message._meta.concrete_fields]
+    with transaction.atomic():
+        detach_partition(month)
+    archives = []
+    try:
+        with connection.chunked_cursor() as cursor:
+            cursor.execute(f'SELECT {data_columns()} FROM {partition_name(month)} ORDER BY conversation_id, "timestamp", id')
+            current, lines, first, last = None, [], None, None
+            for row in cursor:
+                record = dict(zip(columns, row))
+                if record['conversation_id'] != current:
+                    if lines:
+                        archives.append(upload_archive(month, current, lines, first, last))
+                    current, lines, first = record['conversation_id'], [], record['timestamp']
+                lines.append(encode_row(columns, row))
+                last = record['timestamp']
+            if lines:
+                archives.append(upload_archive(month, current, lines, first, last))
+        with transaction.atomic():
+            MessageArchive.objects.bulk_create(archives)
+            drop_partition(month)
+    except Exception:
+        for archive in archives:
+            default_storage.delete(archive.path)
+        with transaction.atomic():
+            attach_partition(month)
+        raise
+    return len(archives)
+
+def load_archive(path):
+    with default_storage.open(path, 'rb') as handle:
+        data = gzip.decompress(handle.read()).decode()
+    return [json.loads(line) for line in data.splitlines() if line]
+
+def archived_records(conversation_id, before=None, after=None):
+    archives = MessageArchive.objects.filter(conversation_id=conversation_id)
+    if after is not None:
+        archives = archives.filter(last_timestamp__gte=after[0]).order_by('month')
+    else:
+        archives = archives.order_by('-month')
+        if before is not None:
+            archives = archives.filter(first_timestamp__lte=before[0])
+    for archive in archives.only('path'):
+        try:
+            records = load_archive(archive.path)
+        except Exception as e:
+            logger.error(f"Failed to read message archive {archive.path}: {e}", exc_info=True)
+            continue
+        yield from (records if after is not None else reversed(records))
+
+def read_archived_messages(conversation_id, before=None, after=None, limit=50):
+    rows = []
+    for record in archived_records(conversation_id, before=before, after=after):
+        key = (parse_datetime(record['timestamp']), record['id'])
+        if (before is not None and key >= before) or (after is not None and key <= after):
+            continue
+        rows.append(record)
+        if len(rows) >= limit:
+            break
+    senders = User.objects.only('id', 'email').in_bulk({row['sender_id'] for row in rows})
+    messages = []
+    for row in rows:
+        if row['sender_id'] not in senders:
+            continue
+        message = Message(
+            id=row['id'],
+            conversation_id=row['conversation_id'],
+            sender_id=row['sender_id'],
+            content=row['content'],
+            seq=row['seq'],
+            timestamp=parse_datetime(row['timestamp']),
+            is_read=row['is_read'],
+            edited_at=parse_datetime(row['edited_at']) if row['edited_at'] else None,
+        )
+        message.sender = senders[row['sender_id']]
+        messages.append(message)
+    return messages
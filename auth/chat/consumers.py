@@ -1,21 +1,302 @@
-from asgiref.sync import sync_to_async
-import json 
-import jwt 
+import asyncio
+import msgpack
+import jwt
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.conf import settings
 from urllib.parse import parse_qs
-from channels.db import database_sync_to_async
-from django.utils import timezone
-from .models import Message
-from .models import Conversation
+from .models import Conversation, ConversationParticipant, Message
 from .serializers import UserListSerializer
+from .utils import conversation_event, conversation_group_name, user_group_name
+from .persistence import get_message_writer, save_message
+from .db import chat_db
+from .presence import PresenceService
+from .throttling import KeyedTokenBuckets, RedisRateLimiter
+from .redis_client import get_redis
+from .wire import JSON, MSGPACK, decode, encode, encode_frames, negotiate
+from . import metrics
 from django.contrib.auth import get_user_model
 import logging
 
 logger = logging.getLogger(__name__)
 
-class ChatConsumer(AsyncWebsocketConsumer):
-    async def connect(self):
+_typing_room_limiter = None
+
+def typing_room_limiter():
+    global _typing_room_limiter
+    if _typing_room_limiter is None:
+        _typing_room_limiter = KeyedTokenBuckets(
+            rate=getattr(settings, 'CHAT_TYPING_ROOM_RATE', 5),
+            burst=getattr(settings, 'CHAT_TYPING_ROOM_BURST', 10),
+        )
+    return _typing_room_limiter
+
+@chat_db
+def get_participant_conversation(user_id, conversation_id):
+    return Conversation.objects.filter(id=conversation_id, participants__id=user_id).prefetch_related(None).first()
+
+@chat_db
+def is_participant(user_id, conversation_id):
+    return ConversationParticipant.objects.filter(conversation_id=conversation_id, user_id=user_id).exists()
+
+@chat_db
+def get_conversation_ids(user_id):
+    return list(ConversationParticipant.objects.filter(user_id=user_id).values_list('conversation_id', flat=True))
+
+def message_payload(message, user_data):
+    return {
+        'message_id': message.id,
+        'seq': message.seq,
+        'message': message.content,
+        'user': user_data,
+        'timestamp': message.timestamp.isoformat(),
+    }
+
+@chat_db
+def get_messages_since(conversation_id, since_seq, limit):
+    messages = Message.objects.filter(conversation_id=conversation_id, seq__gt=since_seq).select_related('sender').order_by('seq')[:limit]
+    return [message_payload(message, UserListSerializer(message.sender).data) for message in messages]
+
+def parse_seq(value):
+    try:
+        seq = int(value)
+    except (TypeError, ValueError):
+        return None
+    return seq if seq >= 0 else None
+
+@chat_db
+def mark_message_read(conversation_id, user_id, message_id):
+    advanced = ConversationParticipant.objects.read_up_to(conversation_id, user_id, message_id)
+    if advanced is None:
+        logger.warning(f"Message {message_id} not found for read receipt")
+    return bool(advanced)
+
+class ConversationSession:
+    def __init__(self, consumer, conversation):
+        self.consumer = consumer
+        self.conversation = conversation
+        self.conversation_id = conversation.id
+        self.group_name = conversation_group_name(conversation.id)
+        self.is_typing = False
+        self.typing_expire_handle = None
+        self.pending_read_id = None
+        self.read_receipt_handle = None
+        self.last_read_receipt_at = 0.0
+        self.presence = None
+        self.presence_refreshed_at = 0.0
+        self.replayed_seq = 0
+
+    @property
+    def user(self):
+        return self.consumer.user
+
+    async def group_send(self, event_type, payload, frame_type=None, **meta):
+        await self.consumer.channel_layer.group_send(self.group_name, conversation_event(event_type, self.conversation_id, payload, frame_type, **meta))
+
+    async def close(self):
+        if self.read_receipt_handle is not None:
+            self.read_receipt_handle.cancel()
+            await self.flush_read_receipt()
+        writer = get_message_writer()
+        if writer is not None and writer.pending(self.conversation_id):
+            await writer.flush()
+        if self.typing_expire_handle is not None:
+            self.typing_expire_handle.cancel()
+            await self.expire_typing()
+        await self.leave_presence()
+
+    async def join_presence(self):
+        try:
+            self.presence = PresenceService()
+            came_online = await self.presence.join(self.conversation_id, self.user.id, self.consumer.channel_name)
+            self.presence_refreshed_at = asyncio.get_running_loop().time()
+            online = await self.presence.online(self.conversation_id)
+            await self.consumer.send_payload({
+                'type': 'presence_snapshot',
+                'conversation_id': self.conversation_id,
+                'online': online,
+                'heartbeat_interval': self.presence.ttl // 3,
+            })
+            if came_online:
+                await self.broadcast_user_status(self.consumer.user_data, 'online')
+        except Exception as e:
+            logger.error(f"Failed to join presence: {e}", exc_info=True)
+
+    async def refresh_presence(self, force=False):
+        if self.presence is None:
+            return
+        now = asyncio.get_running_loop().time()
+        if not force and now - self.presence_refreshed_at < self.presence.ttl / 3:
+            return
+        self.presence_refreshed_at = now
+        try:
+            expired = await self.presence.heartbeat(self.conversation_id, self.user.id, self.consumer.channel_name)
+            for user_id in expired:
+                await self.broadcast_user_status({'id': user_id}, 'offline')
+        except Exception as e:
+            logger.error(f"Failed to refresh presence: {e}", exc_info=True)
+
+    async def leave_presence(self):
+        if self.presence is None:
+            return
+        try:
+            if await self.presence.leave(self.conversation_id, self.user.id, self.consumer.channel_name):
+                await self.broadcast_user_status(self.consumer.user_data, 'offline')
+        except Exception as e:
+            logger.error(f"Failed to leave presence: {e}", exc_info=True)
+
+    async def broadcast_user_status(self, user_data, status):
+        await self.group_send('user_status', {'user': user_data, 'status': status})
+
+    async def handle_chat_message(self, data):
+        message_content = data.get('message', '').strip()
+        if not message_content:
+            await self.consumer.send_error("Message cannot be empty", self.conversation_id)
+            return
+
+        if len(message_content) > 5000:
+            await self.consumer.send_error("Message too long", self.conversation_id)
+            return
+
+        try:
+            message = await save_message(self.conversation, self.user, message_content)
+            user_data = self.consumer.user_data
+            inbox_frames = encode_frames({
+                'type': 'inbox_update',
+                'conversation_id': self.conversation_id,
+                'last_message': {'id': message.id, 'seq': message.seq, 'content': message.content[:100], 'sender': user_data, 'timestamp': message.timestamp.isoformat()},
+                'unread': True,
+            })
+            await self.group_send('chat_message', message_payload(message, user_data), seq=message.seq, sender_id=self.user.id, inbox_frames=inbox_frames)
+            logger.info(f"Message {message.id} sent by {self.user.email}")
+
+        except Exception as e:
+            logger.error(f"Error handling chat message: {e}", exc_info=True)
+            await self.consumer.send_error("Failed to send message", self.conversation_id)
+
+    async def handle_typing_indicator(self, data):
+        is_typing = bool(data.get('is_typing', False))
+        metrics.incr('typing.received')
+        if self.typing_expire_handle is not None:
+            self.typing_expire_handle.cancel()
+            self.typing_expire_handle = None
+        if is_typing:
+            timeout = getattr(settings, 'CHAT_TYPING_TIMEOUT', 5)
+            self.typing_expire_handle = asyncio.get_running_loop().call_later(timeout, lambda: asyncio.ensure_future(self.expire_typing()))
+        if is_typing == self.is_typing:
+            metrics.incr('typing.suppressed_duplicate')
+            return
+        if is_typing and not typing_room_limiter().allow(self.group_name):
+            metrics.incr('typing.suppressed_room_limit')
+            return
+        self.is_typing = is_typing
+        await self.emit_typing(is_typing)
+
+    async def expire_typing(self):
+        self.typing_expire_handle = None
+        if self.is_typing:
+            self.is_typing = False
+            metrics.incr('typing.expired')
+            await self.emit_typing(False)
+
+    async def emit_typing(self, is_typing):
+        metrics.incr('typing.emitted')
+        try:
+            await self.group_send('typing_indicator', {'user': self.consumer.user_data, 'is_typing': is_typing}, frame_type='typing', sender_channel=self.consumer.channel_name)
+        except Exception as e:
+            logger.error(f"Error handling typing indicator: {e}", exc_info=True)
+
+    async def handle_read_receipt(self, data):
+        message_id = data.get('message_id')
+
+        if not message_id:
+            return
+        try:
+            message_id = int(message_id)
+        except (TypeError, ValueError):
+            await self.consumer.send_error("Invalid message id", self.conversation_id)
+            return
+
+        self.pending_read_id = max(self.pending_read_id or 0, message_id)
+        if self.read_receipt_handle is not None:
+            return
+        loop = asyncio.get_running_loop()
+        interval = getattr(settings, 'CHAT_READ_RECEIPT_INTERVAL_MS', 1000) / 1000
+        delay = self.last_read_receipt_at + interval - loop.time()
+        if delay <= 0:
+            await self.flush_read_receipt()
+        else:
+            self.read_receipt_handle = loop.call_later(delay, lambda: asyncio.ensure_future(self.flush_read_receipt()))
+
+    async def flush_read_receipt(self):
+        self.read_receipt_handle = None
+        message_id, self.pending_read_id = self.pending_read_id, None
+        if not message_id:
+            return
+        self.last_read_receipt_at = asyncio.get_running_loop().time()
+        try:
+            writer = get_message_writer()
+            if writer is not None and writer.pending(self.conversation_id):
+                await writer.flush()
+            advanced = await mark_message_read(self.conversation_id, self.user.id, message_id)
+            if advanced:
+                await self.group_send('read_receipt', {'message_id': message_id, 'user_id': self.user.id})
+        except Exception as e:
+            logger.error(f"Error handling read receipt: {e}", exc_info=True)
+
+    async def replay(self, since_seq):
+        writer = get_message_writer()
+        if writer is not None and writer.pending(self.conversation_id):
+            await writer.flush()
+        batch_size = getattr(settings, 'CHAT_REPLAY_BATCH_SIZE', 100)
+        remaining = getattr(settings, 'CHAT_REPLAY_MAX_MESSAGES', 1000)
+        complete = False
+        while remaining > 0:
+            limit = min(batch_size, remaining)
+            messages = await get_messages_since(self.conversation_id, since_seq, limit)
+            if messages:
+                await self.consumer.send_payload({
+                    'type': 'replay',
+                    'conversation_id': self.conversation_id,
+                    'messages': messages,
+                })
+                since_seq = messages[-1]['seq']
+                remaining -= len(messages)
+            if len(messages) < limit:
+                complete = True
+                break
+        self.replayed_seq = max(self.replayed_seq, since_seq)
+        await self.consumer.send_payload({
+            'type': 'replay_complete',
+            'conversation_id': self.conversation_id,
+            'last_seq': since_seq,
+            'complete': complete,
+        })
+
+    async def handle_sync(self, data):
+        since_seq = parse_seq(data.get('since_seq'))
+        if since_seq is None:
+            await self.consumer.send_error("Invalid since_seq", self.conversation_id)
+            return
+        await self.replay(since_seq)
+
+    async def handle_event(self, event_type, data):
+        if event_type == 'sync':
+            await self.handle_sync(data)
+        elif event_type == 'chat_message':
+            await self.handle_chat_message(data)
+        elif event_type == 'typing':
+            await self.handle_typing_indicator(data)
+        elif event_type == 'read_receipt':
+            await self.handle_read_receipt(data)
+        else:
+            return False
+        return True
+
+class BaseChatConsumer(AsyncWebsocketConsumer):
+    user = None
+    wire = JSON
+
+    async def authenticate(self):
         logger.info(f"WebSocket connection attempt from {self.scope.get('client')}")
         query_string = self.scope['query_string'].decode('utf-8')
         params = parse_qs(query_string)
@@ -23,42 +304,149 @@ class ChatConsumer(AsyncWebsocketConsumer):
         if not token:
             logger.warning("Connection rejected: No token provided")
             await self.close(code=4002)
-            return
+            return False
         try:
             decoded_data = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
             self.user = await self.get_user(decoded_data['user_id'])
             if not self.user:
                 logger.warning(f"Connection rejected: User {decoded_data['user_id']} not found")
                 await self.close(code=4003)
-                return
+                return False
             self.scope['user'] = self.user
             logger.info(f"User authenticated: {self.user.email}")
-            
+
         except jwt.ExpiredSignatureError:
             logger.warning("Connection rejected: Token expired")
             await self.close(code=4000)
-            return
+            return False
         except jwt.InvalidTokenError as e:
             logger.warning(f"Connection rejected: Invalid token - {str(e)}")
             await self.close(code=4001)
-            return
+            return False
         except Exception as e:
             logger.error(f"Authentication error: {e}", exc_info=True)
             await self.close(code=4003)
+            return False
+        self.query_params = params
+        self.user_data = self.get_user_data(self.user)
+        self.rate_limiter = RedisRateLimiter(get_redis(), getattr(settings, 'CHAT_RATE_LIMITS', {}))
+        return True
+
+    async def check_rate_limit(self, event_type, data):
+        if event_type not in self.rate_limiter.limits:
+            return True
+        try:
+            allowed, retry_after = await self.rate_limiter.consume(self.user.id, event_type)
+        except Exception as e:
+            metrics.incr('rate_limit.errors')
+            logger.warning(f"Rate limiter unavailable, allowing {event_type}: {e}")
+            return True
+        if allowed:
+            metrics.incr(f'rate_limit.{event_type}.allowed')
+            return True
+        metrics.incr(f'rate_limit.{event_type}.limited')
+        payload = {'type': 'rate_limited', 'event': event_type, 'retry_after': round(retry_after, 3), 'message': 'Too many requests, slow down'}
+        if data.get('conversation_id') is not None:
+            payload['conversation_id'] = data['conversation_id']
+        await self.send_payload(payload)
+        return False
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            if bytes_data is not None:
+                data = decode(bytes_data, MSGPACK)
+            else:
+                data = decode(text_data, JSON)
+            event_type = data.get('type')
+            logger.debug(f"Received {event_type} from {self.user.email}: {str(data)[:100]}")
+            if await self.check_rate_limit(event_type, data):
+                await self.handle_event(event_type, data)
+            await metrics.maybe_flush()
+
+        except (ValueError, msgpack.UnpackException) as e:
+            logger.error(f"Invalid frame received: {e}")
+            await self.send_error("Invalid MessagePack" if bytes_data is not None else "Invalid JSON")
+        except Exception as e:
+            logger.error(f"Error in receive: {e}", exc_info=True)
+            await self.send_error("Internal error")
+
+    async def handle_event(self, event_type, data):
+        raise NotImplementedError
+
+    def get_session(self, conversation_id):
+        raise NotImplementedError
+
+    async def forward_frame(self, event):
+        if self.get_session(event['conversation_id']) is None:
             return
-        
-        self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
-        
-        is_participant = await self.verify_participant(self.user.id, self.conversation_id)
-        if not is_participant:
+        await self.send_encoded(event['frames'][self.wire])
+
+    async def chat_message(self, event):
+        session = self.get_session(event['conversation_id'])
+        if session is not None and event['seq'] <= session.replayed_seq:
+            return
+        await self.send_encoded(event['frames'][self.wire])
+
+    async def typing_indicator(self, event):
+        if event.get('sender_channel') != self.channel_name:
+            await self.forward_frame(event)
+
+    async def user_status(self, event):
+        await self.forward_frame(event)
+
+    async def read_receipt(self, event):
+        await self.forward_frame(event)
+
+    async def send_error(self, message, conversation_id=None):
+        payload = {'type': 'error', 'message': message}
+        if conversation_id is not None:
+            payload['conversation_id'] = conversation_id
+        await self.send_payload(payload)
+
+    async def send_payload(self, payload):
+        await self.send_encoded(encode(payload, self.wire))
+
+    async def send_encoded(self, data):
+        if isinstance(data, bytes):
+            await self.send(bytes_data=data)
+        else:
+            await self.send(text_data=data)
+
+    async def accept_negotiated(self):
+        subprotocol = negotiate(self.scope.get('subprotocols') or [])
+        self.wire = subprotocol or JSON
+        await self.accept(subprotocol=subprotocol)
+
+    @chat_db
+    def get_user(self, user_id):
+        User = get_user_model()
+        try:
+            return User.objects.get(id=user_id)
+        except User.DoesNotExist:
+            return None
+
+    def get_user_data(self, user):
+        return UserListSerializer(user).data
+
+class ChatConsumer(BaseChatConsumer):
+    session = None
+
+    async def connect(self):
+        if not await self.authenticate():
+            return
+
+        self.conversation_id = int(self.scope['url_route']['kwargs']['conversation_id'])
+
+        conversation = await get_participant_conversation(self.user.id, self.conversation_id)
+        if not conversation:
             logger.warning(
                 f"Connection rejected: User {self.user.email} not participant "
                 f"in conversation {self.conversation_id}"
             )
             await self.close(code=4004)
             return
-        self.room_group_name = f'chat_{self.conversation_id}'
-        
+        self.room_group_name = conversation_group_name(self.conversation_id)
+
         try:
             await self.channel_layer.group_add(self.room_group_name,self.channel_name)
             logger.info(
@@ -69,63 +457,37 @@ class ChatConsumer(AsyncWebsocketConsumer):
             logger.error(f"Failed to join channel layer group: {e}", exc_info=True)
             await self.close(code=4005)
             return
-        
-        await self.accept()
-        logger.info(f"WebSocket connection accepted for user {self.user.email}")
-        try:
-            user_data = await self.get_user_data(self.user)
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'user_status',
-                    'user': user_data,
-                    'status': 'online',
-                }
-            )
-        except Exception as e:
-            logger.error(f"Failed to broadcast online status: {e}", exc_info=True)
 
-    async def receive(self, text_data):
-        try:
-            data = json.loads(text_data)
-            event_type = data.get('type')
-            logger.debug(f"Received {event_type} from {self.user.email}: {text_data[:100]}")
-
-            if event_type == 'chat_message':
-                await self.handle_chat_message(data)
-            
-            elif event_type == 'typing':
-                await self.handle_typing_indicator(data)
-            
-            elif event_type == 'read_receipt':
-                await self.handle_read_receipt(data)
-            
+        await self.accept_negotiated()
+        logger.info(f"WebSocket connection accepted for user {self.user.email}")
+        self.session = ConversationSession(self, conversation)
+        await self.session.join_presence()
+        since_seq = self.query_params.get('since_seq', [None])[0]
+        if since_seq is not None:
+            since_seq = parse_seq(since_seq)
+            if since_seq is None:
+                await self.send_error("Invalid since_seq", self.conversation_id)
             else:
-                logger.warning(f"Unknown event type: {event_type}")
-                await self.send_error("Unknown event type")
-        
-        except json.JSONDecodeError as e:
-            logger.error(f"Invalid JSON received: {e}")
-            await self.send_error("Invalid JSON")
-        except Exception as e:
-            logger.error(f"Error in receive: {e}", exc_info=True)
-            await self.send_error("Internal error")
+                await self.session.replay(since_seq)
+
+    async def handle_event(self, event_type, data):
+        await self.session.refresh_presence(force=event_type == 'heartbeat')
+        if event_type == 'heartbeat':
+            return
+        if not await self.session.handle_event(event_type, data):
+            logger.warning(f"Unknown event type: {event_type}")
+            await self.send_error("Unknown event type")
+
+    def get_session(self, conversation_id):
+        return self.session
 
     async def disconnect(self, close_code):
         logger.info(f"WebSocket disconnecting with code {close_code}")
-        
-        if hasattr(self, 'room_group_name') and hasattr(self, 'user'):
+
+        if self.session is not None:
+            await self.session.close()
+            await metrics.maybe_flush(force=True)
             try:
-                user_data = await self.get_user_data(self.user)
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'user_status',
-                        'user': user_data,
-                        'status': 'offline',
-                    }
-                )
-                
                 await self.channel_layer.group_discard(
                     self.room_group_name,
                     self.channel_name
@@ -134,160 +496,137 @@ class ChatConsumer(AsyncWebsocketConsumer):
             except Exception as e:
                 logger.error(f"Error during disconnect: {e}", exc_info=True)
 
-    async def handle_chat_message(self, data):
-        message_content = data.get('message', '').strip()
-        if not message_content:
-            await self.send_error("Message cannot be empty")
-            return
-        
-        if len(message_content) > 5000:
-            await self.send_error("Message too long")
-            return
+    async def membership_changed(self, event):
+        if not await is_participant(self.user.id, self.conversation_id):
+            logger.info(f"User {self.user.email} no longer participant in conversation {self.conversation_id}, closing")
+            await self.close(code=4004)
 
-        try:
-            is_participant = await self.verify_participant(self.user.id, self.conversation_id)
-            if not is_participant:
-                await self.send_error("You are not a participant")
-                return
-            conversation = await self.get_conversation(self.conversation_id)
-            if not conversation:
-                await self.send_error("Conversation not found")
-                return
-            message = await self.save_message(conversation, self.user, message_content)
-            user_data = await self.get_user_data(self.user)
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'chat_message',
-                    'message_id': message.id,
-                    'message': message.content,
-                    'user': user_data,
-                    'timestamp': message.timestamp.isoformat(),
-                }
-            )
-            logger.info(f"Message {message.id} sent by {self.user.email}")
-            
-        except Exception as e:
-            logger.error(f"Error handling chat message: {e}", exc_info=True)
-            await self.send_error("Failed to send message")
+class UserChatConsumer(BaseChatConsumer):
+    conversation_ids = None
+    sessions = None
 
-    async def handle_typing_indicator(self, data):
-        is_typing = data.get('is_typing', False)
-        
+    async def connect(self):
+        if not await self.authenticate():
+            return
+        self.user_group_name = user_group_name(self.user.id)
+        self.sessions = {}
         try:
-            user_data = await self.get_user_data(self.user)
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'typing_indicator',
-                    'user': user_data,
-                    'is_typing': is_typing,
-                    'sender_channel': self.channel_name,
-                }
-            )
+            await self.channel_layer.group_add(self.user_group_name, self.channel_name)
+            self.conversation_ids = set(await get_conversation_ids(self.user.id))
+            for conversation_id in self.conversation_ids:
+                await self.channel_layer.group_add(conversation_group_name(conversation_id), self.channel_name)
         except Exception as e:
-            logger.error(f"Error handling typing indicator: {e}", exc_info=True)
+            logger.error(f"Failed to join channel layer groups: {e}", exc_info=True)
+            await self.close(code=4005)
+            return
 
-    async def handle_read_receipt(self, data):
-        message_id = data.get('message_id')
-        
-        if not message_id:
+        await self.accept_negotiated()
+        logger.info(f"WebSocket connection accepted for user {self.user.email} with {len(self.conversation_ids)} conversations")
+        await self.send_payload({
+            'type': 'conversations',
+            'conversation_ids': sorted(self.conversation_ids),
+        })
+
+    async def handle_event(self, event_type, data):
+        if event_type == 'heartbeat':
+            for session in list(self.sessions.values()):
+                await session.refresh_presence(force=True)
             return
-        
         try:
-            success = await self.mark_message_read(message_id, self.user.id)
-            if success:
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'read_receipt',
-                        'message_id': message_id,
-                        'user_id': self.user.id,
-                    }
-                )
-        except Exception as e:
-            logger.error(f"Error handling read receipt: {e}", exc_info=True)
-
-    async def chat_message(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'chat_message',
-            'message_id': event['message_id'],
-            'message': event['message'],
-            'user': event['user'],
-            'timestamp': event['timestamp'],
-        }))
+            conversation_id = int(data.get('conversation_id'))
+        except (TypeError, ValueError):
+            await self.send_error("Invalid conversation id")
+            return
+        if event_type == 'subscribe':
+            since_seq = data.get('since_seq')
+            if since_seq is not None:
+                since_seq = parse_seq(since_seq)
+                if since_seq is None:
+                    await self.send_error("Invalid since_seq", conversation_id)
+                    return
+            await self.subscribe(conversation_id, since_seq)
+            return
+        if event_type == 'unsubscribe':
+            await self.unsubscribe(conversation_id)
+            return
+        session = self.sessions.get(conversation_id)
+        if session is None:
+            await self.send_error("Not subscribed to this conversation", conversation_id)
+            return
+        await session.refresh_presence()
+        if not await session.handle_event(event_type, data):
+            logger.warning(f"Unknown event type: {event_type}")
+            await self.send_error("Unknown event type", conversation_id)
 
-    async def typing_indicator(self, event):
-        if event.get('sender_channel') != self.channel_name:
-            await self.send(text_data=json.dumps({
-                'type': 'typing',
-                'user': event['user'],
-                'is_typing': event['is_typing'],
-            }))
+    async def subscribe(self, conversation_id, since_seq=None):
+        if conversation_id in self.sessions:
+            return
+        conversation = None
+        if conversation_id in self.conversation_ids:
+            conversation = await get_participant_conversation(self.user.id, conversation_id)
+        if not conversation:
+            await self.send_error("Conversation not found", conversation_id)
+            return
+        session = self.sessions[conversation_id] = ConversationSession(self, conversation)
+        await self.send_payload({'type': 'subscribed', 'conversation_id': conversation_id})
+        await session.join_presence()
+        if since_seq is not None:
+            await session.replay(since_seq)
 
-    async def user_status(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'user_status',
-            'user': event['user'],
-            'status': event['status'],
-        }))
+    async def unsubscribe(self, conversation_id):
+        session = self.sessions.pop(conversation_id, None)
+        if session is not None:
+            await session.close()
+        await self.send_payload({'type': 'unsubscribed', 'conversation_id': conversation_id})
 
-    async def read_receipt(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'read_receipt',
-            'message_id': event['message_id'],
-            'user_id': event['user_id'],
-        }))
-
-    async def send_error(self, message):
-        await self.send(text_data=json.dumps({
-            'type': 'error',
-            'message': message
-        }))
-
-    @database_sync_to_async
-    def get_user(self, user_id):
-        User = get_user_model()
-        try:
-            return User.objects.get(id=user_id)
-        except User.DoesNotExist:
-            return None
+    def get_session(self, conversation_id):
+        return self.sessions.get(conversation_id)
 
-    @database_sync_to_async
-    def get_user_data(self, user):
-        return UserListSerializer(user).data
+    async def disconnect(self, close_code):
+        logger.info(f"WebSocket disconnecting with code {close_code}")
 
-    @database_sync_to_async
-    def get_conversation(self, conversation_id):
+        if self.sessions is None:
+            return
+        for session in list(self.sessions.values()):
+            await session.close()
+        self.sessions.clear()
+        await metrics.maybe_flush(force=True)
         try:
-            return Conversation.objects.get(id=conversation_id)
-        except Conversation.DoesNotExist:
-            return None
+            for conversation_id in self.conversation_ids or ():
+                await self.channel_layer.group_discard(conversation_group_name(conversation_id), self.channel_name)
+            await self.channel_layer.group_discard(self.user_group_name, self.channel_name)
+            logger.info(f"User {self.user.email} left {len(self.conversation_ids or ())} conversations")
+        except Exception as e:
+            logger.error(f"Error during disconnect: {e}", exc_info=True)
 
-    @database_sync_to_async
-    def verify_participant(self, user_id, conversation_id):
-        try:
-            conversation = Conversation.objects.get(id=conversation_id)
-            return conversation.participants.filter(id=user_id).exists()
-        except Conversation.DoesNotExist:
-            return False
+    async def chat_message(self, event):
+        if event['conversation_id'] in self.sessions:
+            await super().chat_message(event)
+            return
 
-    @database_sync_to_async
-    def save_message(self, conversation, user, content):
-        return Message.objects.create(
-            conversation=conversation,
-            sender=user,
-            content=content
-        )
+        if event['sender_id'] != self.user.id:
+            await self.send_encoded(event['inbox_frames'][self.wire])
+            return
+        await self.send_payload({**decode(event['inbox_frames'][JSON], JSON), 'unread': False})
 
-    @database_sync_to_async
-    def mark_message_read(self, message_id, user_id):
-        try:
-            message = Message.objects.get(id=message_id)
-            if message.sender.id != user_id:
-                message.is_read = True
-                message.save()
-            return True
-        except Message.DoesNotExist:
-            logger.warning(f"Message {message_id} not found for read receipt")
-            return False
\ No newline at end of file
+    async def conversation_added(self, event):
+        conversation_id = event['conversation_id']
+        if conversation_id in self.conversation_ids:
+            return
+        if not await is_participant(self.user.id, conversation_id):
+            return
+        await self.channel_layer.group_add(conversation_group_name(conversation_id), self.channel_name)
+        self.conversation_ids.add(conversation_id)
+        await self.send_payload({'type': 'conversation_added', 'conversation_id': conversation_id})
+
+    async def membership_changed(self, event):
+        conversation_id = event['conversation_id']
+        if await is_participant(self.user.id, conversation_id):
+            return
+        session = self.sessions.pop(conversation_id, None)
+        if session is not None:
+            await session.close()
+        self.conversation_ids.discard(conversation_id)
+        await self.channel_layer.group_discard(conversation_group_name(conversation_id), self.channel_name)
+        logger.info(f"User {self.user.email} no longer participant in conversation {conversation_id}, unsubscribed")
+        await self.send_payload({'type': 'conversation_removed', 'conversation_id': conversation_id})
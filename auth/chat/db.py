@@ -0,0 +1,25 @@
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from channels.db import DatabaseSyncToAsync, database_sync_to_async
+from django.conf import settings
+from django.db import connection
+
+_executors = {}
+
+def db_threads():
+    return getattr(settings, 'CHAT_DB_THREADS', 1 if connection.vendor == 'sqlite' else 8)
+
+def db_executor(threads):
+    executor = _executors.get(threads)
+    if executor is None:
+        executor = _executors[threads] = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='chat-db')
+    return executor
+
+def chat_db(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        threads = db_threads()
+        if threads <= 0:
+            return await database_sync_to_async(func)(*args, **kwargs)
+        return await DatabaseSyncToAsync(func, thread_sensitive=False, executor=db_executor(threads))(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,360 @@
+import asyncio
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from account.models import User
+from chat.models import Conversation, Message
+from chat.persistence import BATCHED, IMMEDIATE, get_message_writer, save_message
+from chat.wire import JSON, MSGPACK, decode, encode
+from chat.db import db_threads
+
+IN_MEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer', 'CONFIG': {'capacity': 100000}}}
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, sender=None, connection=None, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        self.install(connection=connection)
+        connection_created.connect(self.install)
+        return self
+
+    def __exit__(self, *exc):
+        connection_created.disconnect(self.install)
+        if self in connection.execute_wrappers:
+            connection.execute_wrappers.remove(self)
+
+class PublishCounter:
+    def __init__(self, layer):
+        self.layer = layer
+        self.count = 0
+        self.group_send = layer.group_send
+        self.send = layer.send
+
+    def __enter__(self):
+        async def group_send(group, message):
+            self.count += 1
+            await self.group_send(group, message)
+        async def send(channel, message):
+            self.count += 1
+            await self.send(channel, message)
+        self.layer.group_send = group_send
+        self.layer.send = send
+        return self
+
+    def __exit__(self, *exc):
+        del self.layer.group_send
+        del self.layer.send
+
+def frame_size(data):
+    return len(data) if isinstance(data, bytes) else len(data.encode())
+
+class CommunicatorClient:
+    def __init__(self, application, path, protocol):
+        from channels.testing import WebsocketCommunicator
+        self.protocol = protocol
+        self.communicator = WebsocketCommunicator(application, path, subprotocols=[protocol])
+        self.received_bytes = 0
+
+    async def connect(self):
+        connected, _ = await self.communicator.connect()
+        return connected
+
+    async def send(self, payload):
+        data = encode(payload, self.protocol)
+        if isinstance(data, bytes):
+            await self.communicator.send_to(bytes_data=data)
+        else:
+            await self.communicator.send_to(text_data=data)
+
+    async def receive(self, timeout):
+        data = await self.communicator.receive_from(timeout=timeout)
+        self.received_bytes += frame_size(data)
+        return decode(data, MSGPACK if isinstance(data, bytes) else JSON)
+
+    async def close(self):
+        await self.communicator.disconnect()
+
+class DaphneClient:
+    def __init__(self, session, url, protocol):
+        self.session = session
+        self.url = url
+        self.protocol = protocol
+        self.ws = None
+        self.received_bytes = 0
+
+    async def connect(self):
+        self.ws = await self.session.ws_connect(self.url, protocols=(self.protocol,))
+        return True
+
+    async def send(self, payload):
+        data = encode(payload, self.protocol)
+        if isinstance(data, bytes):
+            await self.ws.send_bytes(data)
+        else:
+            await self.ws.send_str(data)
+
+    async def receive(self, timeout):
+        message = await self.ws.receive(timeout=timeout)
+        if not isinstance(message.data, (str, bytes)):
+            raise CommandError(f'Websocket closed by server: {message.type}')
+        self.received_bytes += frame_size(message.data)
+        return decode(message.data, MSGPACK if isinstance(message.data, bytes) else JSON)
+
+    async def close(self):
+        await self.ws.close()
+
+class Command(BaseCommand):
+    help = 'Benchmark the chat hot path against a throwaway test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=['persistence', 'websocket', 'wire'])
+        parser.add_argument('--messages', type=int, default=2000, help='Total messages to send per run')
+        parser.add_argument('--conversations', type=int, default=10, help='Number of conversations to spread messages across')
+        parser.add_argument('--participants', type=int, default=2, help='Participants per conversation')
+        parser.add_argument('--clients', help='Comma-separated websocket client counts to run in turn, spread round-robin over all participants (default: one per participant)')
+        parser.add_argument('--db-threads', type=int, help='Override CHAT_DB_THREADS; 0 runs consumer DB calls on the single thread-sensitive executor')
+        parser.add_argument('--endpoint', choices=['room', 'user'], default='room', help='Connect to the per-conversation or the multiplexed per-user consumer')
+        parser.add_argument('--transport', choices=['communicator', 'daphne'], default='communicator', help='Drive the consumers in-process with an in-memory channel layer, or a running daphne server')
+        parser.add_argument('--url', default='ws://127.0.0.1:8000', help='Base websocket URL of the daphne server')
+        parser.add_argument('--protocol', choices=[JSON, MSGPACK], default=JSON, help='Websocket subprotocol the clients negotiate')
+        parser.add_argument('--interval', type=float, default=10, help='Milliseconds each client waits between sends')
+        parser.add_argument('--timeout', type=float, default=30, help='Seconds to wait for every delivery to arrive')
+
+    def handle(self, *args, **options):
+        if options['scenario'] == 'wire':
+            self.run_wire(options)
+            return
+        if options['db_threads'] is not None:
+            with override_settings(CHAT_DB_THREADS=options['db_threads']):
+                self.run_scenario(options)
+        else:
+            self.run_scenario(options)
+
+    def run_scenario(self, options):
+        if options['scenario'] == 'websocket' and options['transport'] == 'daphne':
+            self.run_websocket(options)
+            return
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            getattr(self, f"run_{options['scenario']}")(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def create_conversations(self, count, size, prefix='bench'):
+        users = [User.objects.create_user(f'{prefix}{i}@example.com') for i in range(count * size)]
+        conversations = []
+        for i in range(count):
+            conversation = Conversation.objects.create(name=f'{prefix} {i}', is_group=size > 2)
+            conversation.participants.set(users[i * size:(i + 1) * size])
+            conversations.append(conversation)
+        return conversations
+
+    def run_persistence(self, options):
+        conversations = self.create_conversations(options['conversations'], options['participants'])
+        per_conversation = max(options['messages'] // len(conversations), 1)
+        total = per_conversation * len(conversations)
+        senders = {conversation.id: conversation.participants.first() for conversation in conversations}
+        results = {}
+        for mode in (IMMEDIATE, BATCHED):
+            Message.objects.all().delete()
+            with override_settings(CHAT_MESSAGE_PERSISTENCE=mode):
+                elapsed = asyncio.run(self.send_messages(conversations, senders, per_conversation))
+            stored = Message.objects.count()
+            results[mode] = total / elapsed
+            self.stdout.write(f'{mode:>10}: {total} messages in {elapsed:.3f}s = {results[mode]:.0f} msg/s ({stored} stored)')
+        self.stdout.write(self.style.SUCCESS(f'batched/immediate speedup: {results[BATCHED] / results[IMMEDIATE]:.2f}x'))
+
+    async def send_messages(self, conversations, senders, per_conversation):
+        async def sender(conversation):
+            for i in range(per_conversation):
+                await save_message(conversation, senders[conversation.id], f'benchmark message {i}')
+        start = time.perf_counter()
+        await asyncio.gather(*(sender(conversation) for conversation in conversations))
+        writer = get_message_writer()
+        if writer is not None:
+            await writer.flush()
+        return time.perf_counter() - start
+
+    def run_websocket(self, options):
+        prefix = 'bench' if options['transport'] == 'communicator' else f'bench-{uuid.uuid4().hex[:8]}-'
+        conversations = self.create_conversations(options['conversations'], options['participants'], prefix)
+        members = [(user, conversation.id) for conversation in conversations for user in conversation.participants.all()]
+        try:
+            steps = [int(count) for count in options['clients'].split(',')] if options['clients'] else [len(members)]
+        except ValueError:
+            raise CommandError('--clients must be a comma-separated list of integers')
+        tokens = {user.id: str(AccessToken.for_user(user)) for user, _ in members}
+        try:
+            for clients in steps:
+                plan = [(tokens[user.id], conversation_id) for user, conversation_id in (members[i % len(members)] for i in range(clients))]
+                if options['transport'] == 'communicator':
+                    with override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS):
+                        report = asyncio.run(self.drive_communicators(plan, options))
+                else:
+                    report = asyncio.run(self.drive_daphne(plan, options))
+                self.write_report(report, options)
+        finally:
+            if options['transport'] == 'daphne':
+                Conversation.objects.filter(pk__in=[conversation.id for conversation in conversations]).delete()
+                User.objects.filter(email__startswith=prefix).delete()
+
+    def ws_path(self, token, conversation_id, endpoint):
+        if endpoint == 'user':
+            return f'/ws/chat/?token={token}'
+        return f'/ws/chat/{conversation_id}/?token={token}'
+
+    async def drive_communicators(self, plan, options):
+        from channels.layers import get_channel_layer
+        from channels.routing import URLRouter
+        from chat.routing import websocket_urlpatterns
+        application = URLRouter(websocket_urlpatterns)
+        clients = [CommunicatorClient(application, self.ws_path(token, conversation_id, options['endpoint']), options['protocol']) for token, conversation_id in plan]
+        with QueryCounter() as queries, PublishCounter(get_channel_layer()) as publishes:
+            report = await self.drive(clients, plan, options, counters=(queries, publishes))
+        return report
+
+    async def drive_daphne(self, plan, options):
+        try:
+            import aiohttp
+        except ImportError:
+            raise CommandError('The daphne transport needs aiohttp installed')
+        base = options['url'].rstrip('/')
+        async with aiohttp.ClientSession() as session:
+            clients = [DaphneClient(session, base + self.ws_path(token, conversation_id, options['endpoint']), options['protocol']) for token, conversation_id in plan]
+            return await self.drive(clients, plan, options)
+
+    async def drive(self, clients, plan, options, counters=None):
+        async def open_client(client, conversation_id):
+            if not await client.connect():
+                raise CommandError(f'Websocket connection to conversation {conversation_id} was rejected')
+            if options['endpoint'] == 'user':
+                await client.send({'type': 'subscribe', 'conversation_id': conversation_id})
+                while (await client.receive(options['timeout'])).get('type') != 'subscribed':
+                    pass
+
+        start = time.perf_counter()
+        await asyncio.gather(*(open_client(client, conversation_id) for client, (_, conversation_id) in zip(clients, plan)))
+        connect_elapsed = time.perf_counter() - start
+
+        audience = {}
+        for _, conversation_id in plan:
+            audience[conversation_id] = audience.get(conversation_id, 0) + 1
+        per_client = max(options['messages'] // len(clients), 1)
+        expected = sum(audience[conversation_id] * per_client for _, conversation_id in plan)
+        sent_at = {}
+        latencies = []
+        done = asyncio.Event()
+
+        async def reader(client):
+            while not done.is_set():
+                try:
+                    frame = await client.receive(0.5)
+                except asyncio.TimeoutError:
+                    continue
+                if frame.get('type') != 'chat_message':
+                    continue
+                latencies.append(time.perf_counter() - sent_at[frame['message']])
+                if len(latencies) >= expected:
+                    done.set()
+
+        async def send_loop(index, client, conversation_id):
+            for n in range(per_client):
+                content = f'{index}:{n}'
+                sent_at[content] = time.perf_counter()
+                await client.send({'type': 'chat_message', 'conversation_id': conversation_id, 'message': content})
+                await asyncio.sleep(options['interval'] / 1000)
+
+        readers = [asyncio.create_task(reader(client)) for client in clients]
+        baseline = [counter.count for counter in counters or ()]
+        start = time.perf_counter()
+        await asyncio.gather(*(send_loop(index, client, conversation_id) for index, (client, (_, conversation_id)) in enumerate(zip(clients, plan))))
+        try:
+            await asyncio.wait_for(done.wait(), options['timeout'])
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.perf_counter() - start
+        done.set()
+        await asyncio.gather(*readers)
+        writer = get_message_writer()
+        if writer is not None:
+            await writer.flush()
+        sent = per_client * len(clients)
+        report = {
+            'clients': len(clients),
+            'connect_elapsed': connect_elapsed,
+            'sent': sent,
+            'expected': expected,
+            'delivered': len(latencies),
+            'elapsed': elapsed,
+            'latencies': latencies,
+            'received_bytes': sum(client.received_bytes for client in clients),
+        }
+        if counters:
+            queries, publishes = (counter.count - base for counter, base in zip(counters, baseline))
+            report['queries'] = queries / sent
+            report['publishes'] = publishes / sent
+        for client in clients:
+            await client.close()
+        return report
+
+    def write_report(self, report, options):
+        latencies = report['latencies']
+        self.stdout.write(f"{options['transport']}/{options['endpoint']}/{options['protocol']}: {report['clients']} clients, {options['conversations']} conversations of {options['participants']}, {db_threads()} DB threads")
+        self.stdout.write(f"connected in {report['connect_elapsed']:.3f}s = {report['clients'] / report['connect_elapsed']:.0f} connections/s")
+        self.stdout.write(f"sent {report['sent']} messages in {report['elapsed']:.3f}s = {report['sent'] / report['elapsed']:.0f} msg/s, {report['delivered'] / report['elapsed']:.0f} deliveries/s")
+        self.stdout.write(f"latency p50 {percentile(latencies, 50) * 1000:.2f}ms  p95 {percentile(latencies, 95) * 1000:.2f}ms  p99 {percentile(latencies, 99) * 1000:.2f}ms")
+        if report['delivered']:
+            self.stdout.write(f"{report['received_bytes']} bytes received, {report['received_bytes'] / report['delivered']:.0f} bytes/delivery")
+        if 'queries' in report:
+            self.stdout.write(f"{report['queries']:.2f} DB queries/message, {report['publishes']:.2f} channel-layer publishes/message")
+        lost = report['expected'] - report['delivered']
+        if lost:
+            self.stdout.write(self.style.ERROR(f'{lost} of {report["expected"]} deliveries missing after {options["timeout"]}s'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"all {report['expected']} deliveries received"))
+
+    def run_wire(self, options):
+        timestamp = '2025-11-05T11:00:00.123456+00:00'
+        user = {'id': 1042, 'email': 'traveller@example.com'}
+        def chat_message(i):
+            return {'type': 'chat_message', 'conversation_id': 311, 'message_id': 90000 + i, 'seq': 4000 + i, 'message': f'Booked the houseboat for day {i}, leaving at 7am sharp', 'user': user, 'timestamp': timestamp}
+        samples = {
+            'chat_message': chat_message(1),
+            'typing': {'type': 'typing', 'conversation_id': 311, 'user': user, 'is_typing': True},
+            'read_receipt': {'type': 'read_receipt', 'conversation_id': 311, 'message_id': 90001, 'user_id': 1042},
+            'replay (100 messages)': {'type': 'replay', 'conversation_id': 311, 'messages': [chat_message(i) for i in range(100)]},
+        }
+        rounds = max(options['messages'], 1)
+        for name, payload in samples.items():
+            line = [f'{name:>22}:']
+            for protocol in (JSON, MSGPACK):
+                data = encode(payload, protocol)
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    encode(payload, protocol)
+                encoded = time.perf_counter() - start
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    decode(data, protocol)
+                decoded = time.perf_counter() - start
+                line.append(f'{protocol} {frame_size(data)}B enc {rounds / encoded:.0f}/s dec {rounds / decoded:.0f}/s')
+            self.stdout.write('  '.join(line))
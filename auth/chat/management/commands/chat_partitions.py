@@ -0,0 +1,42 @@
+from datetime import datetime, timezone
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from chat.archive import archive_partition
+from chat.partitions import add_months, ensure_partitions, is_partitioned, list_partitions, month_start, partition_name
+
+class Command(BaseCommand):
+    help = 'Create upcoming monthly chat message partitions and archive old ones to storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['list', 'create', 'archive'])
+        parser.add_argument('--ahead', type=int, default=getattr(settings, 'CHAT_PARTITIONS_AHEAD', 3), help='Months of partitions to keep created ahead of today')
+        parser.add_argument('--older-than', type=int, default=getattr(settings, 'CHAT_ARCHIVE_AFTER_MONTHS', 12), help='Archive partitions that ended more than this many months ago')
+        parser.add_argument('--dry-run', action='store_true', help='Only print the partitions that would be archived')
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            raise CommandError('The chat message table is not partitioned; partitioning requires PostgreSQL')
+        getattr(self, f"run_{options['action']}")(options)
+
+    def run_list(self, options):
+        for month in list_partitions():
+            self.stdout.write(partition_name(month))
+
+    def run_create(self, options):
+        created = ensure_partitions(options['ahead'])
+        for month in created:
+            self.stdout.write(f'created {partition_name(month)}')
+        self.stdout.write(self.style.SUCCESS(f'{len(created)} partitions created'))
+
+    def run_archive(self, options):
+        if options['older_than'] < 1:
+            raise CommandError('--older-than must be at least 1 month')
+        cutoff = add_months(month_start(datetime.now(timezone.utc)), -options['older_than'])
+        months = [month for month in list_partitions() if month < cutoff]
+        for month in months:
+            if options['dry_run']:
+                self.stdout.write(f'would archive {partition_name(month)}')
+                continue
+            conversations = archive_partition(month)
+            self.stdout.write(f'archived {partition_name(month)} ({conversations} conversations)')
+        self.stdout.write(self.style.SUCCESS(f'{len(months)} partitions {"eligible" if options["dry_run"] else "archived"}'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from chat.persistence import replay_spill, spill_path
+
+class Command(BaseCommand):
+    help = 'Write buffered chat messages that were spilled to disk when the database rejected them'
+
+    def handle(self, *args, **options):
+        written, rejected = replay_spill()
+        if rejected:
+            self.stdout.write(self.style.WARNING(f'{rejected} messages still rejected; kept in {spill_path()}'))
+        self.stdout.write(self.style.SUCCESS(f'{written} spilled messages written'))
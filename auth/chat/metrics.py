@@ -0,0 +1,35 @@
+import logging
+import time
+from collections import Counter
+from django.conf import settings
+from .redis_client import get_redis, get_sync_redis
+
+logger = logging.getLogger(__name__)
+
+METRICS_KEY = 'chat:metrics'
+
+_counters = Counter()
+_last_flush = time.monotonic()
+
+def incr(name, amount=1):
+    _counters[name] += amount
+
+async def maybe_flush(force=False):
+    global _last_flush
+    now = time.monotonic()
+    if not _counters or (not force and now - _last_flush < getattr(settings, 'CHAT_METRICS_FLUSH_INTERVAL', 10)):
+        return
+    _last_flush = now
+    counters = dict(_counters)
+    _counters.clear()
+    try:
+        async with get_redis().pipeline(transaction=False) as pipe:
+            for name, value in counters.items():
+                pipe.hincrby(METRICS_KEY, name, value)
+            await pipe.execute()
+    except Exception as e:
+        _counters.update(counters)
+        logger.warning(f"Failed to flush chat metrics: {e}")
+
+def read_metrics():
+    return {name: int(value) for name, value in sorted(get_sync_redis().hgetall(METRICS_KEY).items())}
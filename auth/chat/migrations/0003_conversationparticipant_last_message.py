@@ -0,0 +1,63 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_inbox(apps, schema_editor):
+    Conversation = apps.get_model('chat', 'Conversation')
+    ConversationParticipant = apps.get_model('chat', 'ConversationParticipant')
+    Message = apps.get_model('chat', 'Message')
+    latest = Message.objects.filter(conversation=OuterRef('pk')).order_by('-timestamp', '-id').values('id')[:1]
+    Conversation.objects.update(last_message=Subquery(latest))
+    unread = Message.objects.filter(conversation=OuterRef('conversation'), is_read=False).exclude(sender=OuterRef('user')).order_by().values('conversation').annotate(count=Count('id')).values('count')
+    ConversationParticipant.objects.update(unread_count=Coalesce(Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_message_timestamp_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ConversationParticipant',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='chat.conversation')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_memberships', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'chat_conversation_participants',
+                        'unique_together': {('conversation', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='conversation',
+                    name='participants',
+                    field=models.ManyToManyField(related_name='conversations', through='chat.ConversationParticipant', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='last_read_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message'),
+        ),
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message'),
+        ),
+        migrations.RunPython(backfill_inbox, migrations.RunPython.noop),
+    ]
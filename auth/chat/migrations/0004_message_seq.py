@@ -0,0 +1,47 @@
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_seq(apps, schema_editor):
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+    table = Message._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET seq = ranked.seq FROM ("
+            f"SELECT id, ROW_NUMBER() OVER (PARTITION BY conversation_id ORDER BY timestamp, id) AS seq FROM {table}"
+            f") AS ranked WHERE {table}.id = ranked.id"
+        )
+    last_seq = Message.objects.filter(conversation=OuterRef('pk')).order_by().values('conversation').annotate(last=Max('seq')).values('last')
+    Conversation.objects.update(last_seq=Coalesce(Subquery(last_seq), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_conversationparticipant_last_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_seq',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='seq',
+            field=models.PositiveBigIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_seq, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='message',
+            name='seq',
+            field=models.PositiveBigIntegerField(editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='message',
+            constraint=models.UniqueConstraint(fields=('conversation', 'seq'), name='chat_message_conversation_seq_uniq'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations
+
+POSTGRES_FORWARD = [
+    "ALTER TABLE chat_message ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (to_tsvector('english', content)) STORED",
+    "CREATE INDEX chat_message_search_vector_gin ON chat_message USING GIN (search_vector)",
+]
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS chat_message_search_vector_gin",
+    "ALTER TABLE chat_message DROP COLUMN IF EXISTS search_vector",
+]
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE chat_message_fts USING fts5(content, content='chat_message', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER chat_message_fts_ai AFTER INSERT ON chat_message BEGIN "
+    "INSERT INTO chat_message_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER chat_message_fts_ad AFTER DELETE ON chat_message BEGIN "
+    "INSERT INTO chat_message_fts(chat_message_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER chat_message_fts_au AFTER UPDATE OF content ON chat_message BEGIN "
+    "INSERT INTO chat_message_fts(chat_message_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO chat_message_fts(rowid, content) VALUES (new.id, new.content); END",
+    "INSERT INTO chat_message_fts(chat_message_fts) VALUES ('rebuild')",
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS chat_message_fts_au",
+    "DROP TRIGGER IF EXISTS chat_message_fts_ad",
+    "DROP TRIGGER IF EXISTS chat_message_fts_ai",
+    "DROP TABLE IF EXISTS chat_message_fts",
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for statement in statements.get(vendor, []):
+            schema_editor.execute(statement)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_message_seq'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run({'postgresql': POSTGRES_REVERSE, 'sqlite': SQLITE_REVERSE}),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_dm_key(apps, schema_editor):
+    Conversation = apps.get_model('chat', 'Conversation')
+    ConversationParticipant = apps.get_model('chat', 'ConversationParticipant')
+    direct = Conversation.objects.filter(is_group=False).annotate(member_count=Count('memberships')).filter(member_count=2).order_by('created_at', 'id').values_list('id', flat=True)
+    members = {}
+    for conversation_id, user_id in ConversationParticipant.objects.filter(conversation_id__in=direct).values_list('conversation_id', 'user_id'):
+        members.setdefault(conversation_id, []).append(user_id)
+    seen = set()
+    for conversation_id in direct:
+        low, high = sorted(members[conversation_id])
+        key = f'{low}:{high}'
+        if key in seen:
+            continue
+        seen.add(key)
+        Conversation.objects.filter(pk=conversation_id).update(dm_key=key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_message_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='dm_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_dm_key, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,156 @@
+import django.db.models.deletion
+from datetime import date, datetime, timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+# A unique constraint on a partitioned table has to include the partition key, so
+# UNIQUE (conversation_id, seq) cannot live on chat_message itself. The pairs are
+# kept in an unpartitioned side table instead, maintained by row triggers in the
+# same transaction as the message write, so a duplicate seq still fails the insert.
+SEQ_KEYS_SQL = (
+    'CREATE TABLE {keys} (conversation_id bigint NOT NULL, seq bigint NOT NULL, '
+    'CONSTRAINT chat_message_conversation_seq_uniq PRIMARY KEY (conversation_id, seq))',
+    'INSERT INTO {keys} (conversation_id, seq) SELECT conversation_id, seq FROM {table}',
+    """CREATE FUNCTION {keys}_sync() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        DELETE FROM {keys} WHERE conversation_id = OLD.conversation_id AND seq = OLD.seq;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO {keys} (conversation_id, seq) VALUES (NEW.conversation_id, NEW.seq);
+    END IF;
+    RETURN NULL;
+END;
+$$""",
+    'CREATE TRIGGER {keys}_sync AFTER INSERT OR DELETE OR UPDATE OF conversation_id, seq ON {table} '
+    'FOR EACH ROW EXECUTE FUNCTION {keys}_sync()',
+)
+
+DROP_SEQ_KEYS_SQL = (
+    'DROP TRIGGER IF EXISTS {keys}_sync ON {table}',
+    'DROP FUNCTION IF EXISTS {keys}_sync()',
+    'DROP TABLE IF EXISTS {keys}',
+)
+
+
+def partition_messages(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Message = apps.get_model('chat', 'Message')
+    Conversation = apps.get_model('chat', 'Conversation')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    table = Message._meta.db_table
+    legacy = f'{table}_legacy'
+    columns = ', '.join(f'"{field.column}"' for field in Message._meta.concrete_fields)
+    execute = schema_editor.execute
+
+    execute(f'ALTER TABLE {table} RENAME TO {legacy}')
+    execute(f'CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED) PARTITION BY RANGE ("timestamp")')
+    execute(f'CREATE SEQUENCE {table}_partitioned_id_seq OWNED BY {table}.id')
+    execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{table}_partitioned_id_seq')")
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'SELECT MIN("timestamp") FROM {legacy}')
+        oldest = cursor.fetchone()[0]
+    today = datetime.now(timezone.utc)
+    month = date((oldest or today).year, (oldest or today).month, 1)
+    last = add_months(date(today.year, today.month, 1), getattr(settings, 'CHAT_PARTITIONS_AHEAD', 3))
+    while month <= last:
+        end = add_months(month, 1)
+        execute(
+            f'CREATE TABLE {table}_y{month.year}m{month.month:02d} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)',
+            [datetime(month.year, month.month, 1, tzinfo=timezone.utc), datetime(end.year, end.month, 1, tzinfo=timezone.utc)],
+        )
+        month = end
+    execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+
+    execute(f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {legacy}')
+    execute(f"SELECT setval('{table}_partitioned_id_seq', COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)")
+    execute(f'DROP TABLE {legacy}')
+
+    execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, "timestamp")')
+    execute(f'CREATE INDEX {table}_conversation_seq_idx ON {table} (conversation_id, seq)')
+    for statement in SEQ_KEYS_SQL:
+        execute(statement.format(table=table, keys=f'{table}_seq_keys'))
+    execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_conversation_id_fk FOREIGN KEY (conversation_id) REFERENCES {Conversation._meta.db_table} (id) DEFERRABLE INITIALLY DEFERRED')
+    execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_sender_id_fk FOREIGN KEY (sender_id) REFERENCES {User._meta.db_table} (id) DEFERRABLE INITIALLY DEFERRED')
+    execute(f'CREATE INDEX {table}_sender_id_idx ON {table} (sender_id)')
+    for index in Message._meta.indexes:
+        schema_editor.add_index(Message, index)
+    execute(f'CREATE INDEX {table}_search_vector_gin ON {table} USING GIN (search_vector)')
+
+
+def unpartition_messages(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Message = apps.get_model('chat', 'Message')
+    Conversation = apps.get_model('chat', 'Conversation')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    table = Message._meta.db_table
+    partitioned = f'{table}_partitioned'
+    columns = ', '.join(f'"{field.column}"' for field in Message._meta.concrete_fields)
+    execute = schema_editor.execute
+
+    for statement in DROP_SEQ_KEYS_SQL:
+        execute(statement.format(table=table, keys=f'{table}_seq_keys'))
+    execute(f'ALTER TABLE {table} RENAME TO {partitioned}')
+    execute(f'CREATE TABLE {table} (LIKE {partitioned} INCLUDING DEFAULTS INCLUDING GENERATED)')
+    execute(f'ALTER TABLE {table} ALTER COLUMN id DROP DEFAULT')
+    execute(f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {partitioned}')
+    execute(f'DROP TABLE {partitioned}')
+    execute(f'ALTER TABLE {table} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY')
+    execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)")
+
+    execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)')
+    execute(f'ALTER TABLE {table} ADD CONSTRAINT chat_message_conversation_seq_uniq UNIQUE (conversation_id, seq)')
+    execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_conversation_id_fk FOREIGN KEY (conversation_id) REFERENCES {Conversation._meta.db_table} (id) DEFERRABLE INITIALLY DEFERRED')
+    execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_sender_id_fk FOREIGN KEY (sender_id) REFERENCES {User._meta.db_table} (id) DEFERRABLE INITIALLY DEFERRED')
+    execute(f'CREATE INDEX {table}_sender_id_idx ON {table} (sender_id)')
+    for index in Message._meta.indexes:
+        schema_editor.add_index(Message, index)
+    execute(f'CREATE INDEX {table}_search_vector_gin ON {table} USING GIN (search_vector)')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_conversation_dm_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='conversation',
+            name='last_message',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message'),
+        ),
+        migrations.AlterField(
+            model_name='conversationparticipant',
+            name='last_read_message',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message'),
+        ),
+        migrations.CreateModel(
+            name='MessageArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('path', models.CharField(max_length=255)),
+                ('message_count', models.PositiveIntegerField()),
+                ('first_timestamp', models.DateTimeField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archives', to='chat.conversation')),
+            ],
+            options={
+                'ordering': ['-month'],
+                'unique_together': {('conversation', 'month')},
+            },
+        ),
+        migrations.RunPython(partition_messages, unpartition_messages),
+    ]
@@ -1,17 +1,56 @@
-from django.db import models
+from django.db import connection, models, transaction
 from account.models import User
-from django.db.models import Prefetch
+from django.db.models import Case, Count, F, Prefetch, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 class ConversationManager(models.Manager):
     def get_queryset(self):
         return super().get_queryset().prefetch_related( Prefetch('participants', queryset=User.objects.only('id', 'email')))
     def for_user(self, user):
         return self.get_queryset().filter(participants=user)
+    def dm_key(self, user_a, user_b):
+        low, high = sorted((int(user_a), int(user_b)))
+        return f'{low}:{high}'
+    def get_or_create_direct(self, user_a, user_b, name=''):
+        with transaction.atomic():
+            conversation, created = self.get_or_create(dm_key=self.dm_key(user_a, user_b), defaults={'name': name, 'is_group': False})
+            if created:
+                conversation.participants.set([user_a, user_b])
+        return conversation, created
+    def allocate_seq(self, conversation_id, count=1):
+        table = self.model._meta.db_table
+        if connection.vendor in ('postgresql', 'sqlite'):
+            with connection.cursor() as cursor:
+                cursor.execute(f"UPDATE {table} SET last_seq = last_seq + %s WHERE id = %s RETURNING last_seq", [count, conversation_id])
+                return cursor.fetchone()[0]
+        with transaction.atomic():
+            self.filter(pk=conversation_id).update(last_seq=F('last_seq') + count)
+            return self.filter(pk=conversation_id).values_list('last_seq', flat=True).get()
+    def record_messages(self, messages):
+        latest = {}
+        senders = {}
+        for message in messages:
+            current = latest.get(message.conversation_id)
+            if current is None or message.seq > current.seq:
+                latest[message.conversation_id] = message
+            counts = senders.setdefault(message.conversation_id, {})
+            counts[message.sender_id] = counts.get(message.sender_id, 0) + 1
+        for conversation_id, message in latest.items():
+            newer = Q(last_message__seq__isnull=True) | Q(last_message__seq__lt=message.seq)
+            self.filter(newer, pk=conversation_id).update(updated_at=message.timestamp, last_message=message.id)
+            counts = senders[conversation_id]
+            total = sum(counts.values())
+            unread = Case(*[When(user_id=sender_id, then=Value(total - count)) for sender_id, count in counts.items()], default=Value(total))
+            ConversationParticipant.objects.filter(conversation_id=conversation_id).update(unread_count=F('unread_count') + unread)
 
 class Conversation(models.Model):
-    participants = models.ManyToManyField(User, related_name='conversations')
+    participants = models.ManyToManyField(User, through='ConversationParticipant', related_name='conversations')
     name = models.CharField(max_length=255, null=True, blank=True) 
     is_group = models.BooleanField(default=False) 
+    dm_key = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+    last_message = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', db_constraint=False)
+    last_seq = models.PositiveBigIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True) 
     objects = ConversationManager()
@@ -31,19 +70,53 @@ class Conversation(models.Model):
             self.is_group = True
             super().save(update_fields=['is_group'])
     
-    @property
-    def last_message(self):
-        return self.messages.order_by('-timestamp').first()
+    def refresh_last_message(self):
+        self.last_message = self.messages.order_by('-seq').first()
+        Conversation.objects.filter(pk=self.pk).update(last_message=self.last_message)
     
     def is_participant(self, user):
         return self.participants.filter(id=user.id).exists()
 
 
+class ConversationParticipantManager(models.Manager):
+    def mark_read(self, conversation_id, user_id, message):
+        unread = Message.objects.filter(seq__gt=message.seq, conversation_id=conversation_id).exclude(sender_id=user_id).order_by().values('conversation_id').annotate(count=Count('id')).values('count')
+        behind = Q(last_read_message__seq__isnull=True) | Q(last_read_message__seq__lt=message.seq)
+        return self.filter(behind, conversation_id=conversation_id, user_id=user_id).update(last_read_message=message.id, unread_count=Coalesce(Subquery(unread), 0))
+    def forget_unread(self, message):
+        behind = Q(last_read_message__seq__isnull=True) | Q(last_read_message__seq__lt=message.seq)
+        return self.filter(behind, conversation_id=message.conversation_id, unread_count__gt=0).exclude(user_id=message.sender_id).update(unread_count=F('unread_count') - 1)
+    def read_up_to(self, conversation_id, user_id, message_id):
+        message = Message.objects.filter(id=message_id, conversation_id=conversation_id).only('id', 'seq').first()
+        if message is None:
+            return None
+        advanced = self.mark_read(conversation_id, user_id, message)
+        if advanced:
+            Message.objects.filter(seq__lte=message.seq, conversation_id=conversation_id, is_read=False).exclude(sender_id=user_id).update(is_read=True)
+        return advanced
+
+
+class ConversationParticipant(models.Model):
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='memberships')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversation_memberships')
+    last_read_message = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', db_constraint=False)
+    unread_count = models.PositiveIntegerField(default=0)
+    objects = ConversationParticipantManager()
+
+    class Meta:
+        db_table = 'chat_conversation_participants'
+        unique_together = ('conversation', 'user')
+
+    def __str__(self):
+        return f'{self.user_id} in conversation {self.conversation_id}'
+
+
 class Message(models.Model):
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE,related_name='messages')
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
     content = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    seq = models.PositiveBigIntegerField(editable=False)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     is_read = models.BooleanField(default=False) 
     edited_at = models.DateTimeField(null=True, blank=True) 
 
@@ -53,11 +126,39 @@ class Message(models.Model):
             models.Index(fields=['conversation', 'timestamp']),
             models.Index(fields=['conversation', '-timestamp']),
         ]
+        # On Postgres the partitioned table cannot carry this constraint; migration 0007
+        # enforces the same (conversation, seq) uniqueness through chat_message_seq_keys.
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'seq'], name='chat_message_conversation_seq_uniq'),
+        ]
 
     def __str__(self):
         preview = self.content[:50] + "..." if len(self.content) > 50 else self.content
         return f'Message from {self.sender.email}: {preview}'
     
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.conversation.save(update_fields=['updated_at'])
\ No newline at end of file
+        adding = self._state.adding
+        with transaction.atomic():
+            if adding and self.seq is None:
+                self.seq = Conversation.objects.allocate_seq(self.conversation_id)
+            super().save(*args, **kwargs)
+            if adding:
+                Conversation.objects.record_messages([self])
+        if not adding:
+            Conversation.objects.filter(pk=self.conversation_id).update(updated_at=timezone.now())
+
+class MessageArchive(models.Model):
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='archives')
+    month = models.DateField()
+    path = models.CharField(max_length=255)
+    message_count = models.PositiveIntegerField()
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-month']
+        unique_together = ('conversation', 'month')
+
+    def __str__(self):
+        return f'Archive of conversation {self.conversation_id} for {self.month:%Y-%m}'
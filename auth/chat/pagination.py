@@ -0,0 +1,48 @@
+from auth.pagination import KeysetPagination, RankedSearchPagination
+from .archive import read_archived_messages
+
+class MessageKeysetPagination(KeysetPagination):
+    ordering_field = 'timestamp'
+    page_size = 50
+    max_page_size = 200
+    chronological = True
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = super().paginate_queryset(queryset, request, view)
+        if view is None:
+            return page
+        after = self.decode_cursor(queryset.model, request.query_params.get('after'))
+        if after:
+            return self.merge_archived_after(page, view, after)
+        if self.has_more:
+            return page
+        boundary = self.decode_cursor(queryset.model, request.query_params.get('before'))
+        if self.oldest is not None:
+            boundary = (self.oldest.timestamp, self.oldest.pk)
+        needed = self.limit - len(page)
+        archived = read_archived_messages(view.kwargs['conversation_id'], before=boundary, limit=needed + 1)
+        if not archived:
+            return page
+        self.has_more = len(archived) > needed
+        archived = archived[:needed]
+        if not archived:
+            return page
+        self.oldest = archived[-1]
+        if self.newest is None:
+            self.newest = archived[0]
+        archived.reverse()
+        return archived + page
+
+    def merge_archived_after(self, page, view, after):
+        archived = read_archived_messages(view.kwargs['conversation_id'], after=after, limit=self.limit + 1)
+        if not archived:
+            return page
+        merged = archived + page
+        self.has_more = self.has_more or len(merged) > self.limit
+        merged = merged[:self.limit]
+        self.oldest, self.newest = merged[0], merged[-1]
+        return merged
+
+class MessageSearchPagination(RankedSearchPagination):
+    page_size = 20
+    max_page_size = 50
@@ -0,0 +1,94 @@
+import re
+from datetime import date, datetime, timezone as dt_timezone
+from django.db import connection, transaction
+from .models import Message
+
+PARTITION_NAME = re.compile(r'_y(\d{4})m(\d{2})$')
+
+def message_table():
+    return Message._meta.db_table
+
+def default_partition():
+    return f'{message_table()}_default'
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def month_bounds(month):
+    start = datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+    end = add_months(month, 1)
+    return start, datetime(end.year, end.month, 1, tzinfo=dt_timezone.utc)
+
+def partition_name(month):
+    return f'{message_table()}_y{month.year}m{month.month:02d}'
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = %s", [message_table()])
+        return cursor.fetchone() is not None
+
+def list_partitions():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = %s",
+            [message_table()],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    months = []
+    for name in names:
+        match = PARTITION_NAME.search(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+def data_columns():
+    return ', '.join(f'"{field.column}"' for field in Message._meta.concrete_fields)
+
+def create_partition(month):
+    table = message_table()
+    name = partition_name(month)
+    start, end = month_bounds(month)
+    columns = data_columns()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'CREATE TEMP TABLE moved_messages AS SELECT {columns} FROM {default_partition()} WITH NO DATA')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {default_partition()} WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING {columns}) '
+            f'INSERT INTO moved_messages SELECT * FROM moved',
+            [start, end],
+        )
+        moved = cursor.rowcount
+        cursor.execute(f'CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)', [start, end])
+        if moved:
+            cursor.execute(f'INSERT INTO {table} ({columns}) SELECT {columns} FROM moved_messages')
+        cursor.execute('DROP TABLE moved_messages')
+    return moved
+
+def ensure_partitions(ahead, today=None):
+    current = month_start(today or datetime.now(dt_timezone.utc))
+    existing = set(list_partitions())
+    created = []
+    for offset in range(ahead + 1):
+        month = add_months(current, offset)
+        if month not in existing:
+            create_partition(month)
+            created.append(month)
+    return created
+
+def detach_partition(month):
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {message_table()} DETACH PARTITION {partition_name(month)}')
+
+def attach_partition(month):
+    start, end = month_bounds(month)
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {message_table()} ATTACH PARTITION {partition_name(month)} FOR VALUES FROM (%s) TO (%s)', [start, end])
+
+def drop_partition(month):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE {partition_name(month)}')
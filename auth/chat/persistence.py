@@ -0,0 +1,274 @@
+import asyncio
+import atexit
+import json
+import logging
+import os
+from datetime import datetime
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from auth.sequences import reserve_ids
+from .models import Conversation, Message
+from .db import chat_db
+
+logger = logging.getLogger(__name__)
+
+BATCHED = 'batched'
+IMMEDIATE = 'immediate'
+MAX_BACKOFF = 30
+
+def persistence_mode():
+    mode = getattr(settings, 'CHAT_MESSAGE_PERSISTENCE', IMMEDIATE)
+    if mode == BATCHED and connection.vendor not in ('postgresql', 'sqlite'):
+        return IMMEDIATE
+    return mode
+
+def reserve_message_ids(count):
+    return reserve_ids(Message, count)
+
+def assign_seqs(messages):
+    counts = {}
+    for message in messages:
+        if message.seq is None:
+            counts[message.conversation_id] = counts.get(message.conversation_id, 0) + 1
+    next_seq = {conversation_id: Conversation.objects.allocate_seq(conversation_id, count) - count + 1 for conversation_id, count in counts.items()}
+    for message in messages:
+        if message.seq is None:
+            message.seq = next_seq[message.conversation_id]
+            next_seq[message.conversation_id] += 1
+
+def write_messages(messages):
+    try:
+        with transaction.atomic():
+            Message.objects.bulk_create(messages)
+            Conversation.objects.record_messages(messages)
+        return []
+    except DatabaseError as e:
+        logger.warning(f"Bulk write of {len(messages)} buffered messages failed, writing them one by one: {e}")
+    rejected = []
+    for message in messages:
+        try:
+            with transaction.atomic():
+                Message.objects.bulk_create([message])
+                Conversation.objects.record_messages([message])
+        except DatabaseError as e:
+            logger.error(f"Failed to write buffered message {message.id}: {e}")
+            rejected.append(message)
+    return rejected
+
+def spill_path():
+    return getattr(settings, 'CHAT_BATCH_SPILL_PATH')
+
+def spill_messages(messages, path=None):
+    path = path or spill_path()
+    with open(path, 'a') as handle:
+        for message in messages:
+            handle.write(json.dumps({
+                'id': message.id,
+                'conversation_id': message.conversation_id,
+                'sender_id': message.sender_id,
+                'content': message.content,
+                'timestamp': message.timestamp.isoformat(),
+                'seq': message.seq,
+            }) + '\n')
+        handle.flush()
+        os.fsync(handle.fileno())
+
+def load_spill(path):
+    messages = []
+    with open(path) as handle:
+        for line in handle:
+            if line.strip():
+                row = json.loads(line)
+                row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+                messages.append(Message(**row))
+    return messages
+
+def replay_spill():
+    path = spill_path()
+    claimed = f'{path}.replaying'
+    if os.path.exists(path):
+        os.replace(path, claimed)
+    elif not os.path.exists(claimed):
+        return 0, 0
+    messages = load_spill(claimed)
+    written = set(Message.objects.filter(id__in=[m.id for m in messages]).values_list('id', flat=True))
+    messages = [message for message in messages if message.id not in written]
+    rejected = write_messages(messages) if messages else []
+    if rejected:
+        spill_messages(rejected)
+    os.remove(claimed)
+    return len(messages) - len(rejected), len(rejected)
+
+class MessageWriter:
+    def __init__(self, flush_interval, max_size, max_retries):
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.max_retries = max_retries
+        self.loop = asyncio.get_running_loop()
+        self._unsequenced = []
+        self._buffer = []
+        self._sequenced = {}
+        self._ids = []
+        self._id_lock = asyncio.Lock()
+        self._seq_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._seq_handle = None
+        self._flush_handle = None
+        self._seq_failures = 0
+        self._write_failures = 0
+
+    async def save(self, conversation, sender, content):
+        message_id = await self._next_id()
+        message = Message(id=message_id, conversation=conversation, sender=sender, content=content, timestamp=timezone.now())
+        sequenced = self._sequenced[message_id] = self.loop.create_future()
+        self._unsequenced.append(message)
+        if self._seq_handle is None:
+            self._seq_handle = self.loop.call_soon(self._schedule_sequence)
+        return await sequenced
+
+    def pending(self, conversation_id):
+        return [message for message in self._buffer if message.conversation_id == conversation_id]
+
+    def backoff(self, failures):
+        return min(self.flush_interval * 2 ** failures, MAX_BACKOFF)
+
+    async def sequence(self):
+        async with self._seq_lock:
+            batch, self._unsequenced = self._unsequenced, []
+            if not batch:
+                return
+            try:
+                await chat_db(assign_seqs)(batch)
+            except Exception as e:
+                logger.error(f"Failed to allocate seqs for {len(batch)} buffered messages: {e}", exc_info=True)
+            sequenced = [message for message in batch if message.seq is not None]
+            unsequenced = [message for message in batch if message.seq is None]
+            self._buffer.extend(sequenced)
+            for message in sequenced:
+                waiter = self._sequenced.pop(message.id, None)
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(message)
+            if sequenced:
+                self._seq_failures = 0
+                if len(self._buffer) >= self.max_size and not self._write_failures:
+                    self.loop.create_task(self.flush())
+                elif self._flush_handle is None:
+                    self._flush_handle = self.loop.call_later(self.flush_interval, self._schedule_flush)
+            if not unsequenced:
+                return
+            self._seq_failures += 1
+            if self._seq_failures > self.max_retries:
+                for message in unsequenced:
+                    waiter = self._sequenced.pop(message.id, None)
+                    if waiter is not None and not waiter.done():
+                        waiter.set_exception(RuntimeError(f'Could not allocate a seq for message {message.id}'))
+                self._seq_failures = 0
+                return
+            self._unsequenced = unsequenced + self._unsequenced
+            if self._seq_handle is not None:
+                self._seq_handle.cancel()
+            self._seq_handle = self.loop.call_later(self.backoff(self._seq_failures), self._schedule_sequence)
+
+    async def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        async with self._flush_lock:
+            batch, self._buffer = self._buffer, []
+            if not batch:
+                return
+            try:
+                rejected = await chat_db(write_messages)(batch)
+            except Exception as e:
+                logger.error(f"Failed to flush {len(batch)} buffered messages: {e}", exc_info=True)
+                rejected = batch
+            if not rejected:
+                self._write_failures = 0
+                return
+            self._write_failures += 1
+            if self._write_failures > self.max_retries:
+                try:
+                    await chat_db(spill_messages)(rejected)
+                    logger.error(f"Spilled {len(rejected)} buffered messages to {spill_path()} after {self._write_failures} failed flushes: {[m.id for m in rejected]}")
+                    self._write_failures = 0
+                    return
+                except OSError as e:
+                    logger.error(f"Failed to spill {len(rejected)} buffered messages, keeping them buffered: {e}", exc_info=True)
+            delay = self.backoff(self._write_failures)
+            logger.error(f"Retrying {len(rejected)} of {len(batch)} buffered messages in {delay:.2f}s")
+            self._buffer = rejected + self._buffer
+            if self._flush_handle is not None:
+                self._flush_handle.cancel()
+            self._flush_handle = self.loop.call_later(delay, self._schedule_flush)
+
+    def drain(self):
+        for handle in (self._seq_handle, self._flush_handle):
+            if handle is not None:
+                handle.cancel()
+        self._seq_handle = self._flush_handle = None
+        unsequenced, self._unsequenced = self._unsequenced, []
+        if unsequenced:
+            try:
+                assign_seqs(unsequenced)
+            except Exception as e:
+                logger.error(f"Failed to allocate seqs for {len(unsequenced)} unsent messages at shutdown: {e}", exc_info=True)
+            lost = [message.id for message in unsequenced if message.seq is None]
+            if lost:
+                logger.error(f"Discarding {len(lost)} messages that were never sent: {lost}")
+        batch = self._buffer + [message for message in unsequenced if message.seq is not None]
+        self._buffer = []
+        if not batch:
+            return
+        try:
+            rejected = write_messages(batch)
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} buffered messages at shutdown: {e}", exc_info=True)
+            rejected = batch
+        if rejected:
+            spill_messages(rejected)
+            logger.error(f"Spilled {len(rejected)} buffered messages to {spill_path()} at shutdown: {[m.id for m in rejected]}")
+
+    def _schedule_sequence(self):
+        self._seq_handle = None
+        self.loop.create_task(self.sequence())
+
+    def _schedule_flush(self):
+        self._flush_handle = None
+        self.loop.create_task(self.flush())
+
+    async def _next_id(self):
+        async with self._id_lock:
+            if not self._ids:
+                self._ids = await chat_db(reserve_message_ids)(self.max_size)
+            return self._ids.pop(0)
+
+_writer = None
+
+def get_message_writer():
+    global _writer
+    if persistence_mode() != BATCHED:
+        return None
+    if _writer is None or _writer.loop is not asyncio.get_running_loop():
+        _writer = MessageWriter(
+            flush_interval=getattr(settings, 'CHAT_BATCH_FLUSH_INTERVAL_MS', 50) / 1000,
+            max_size=getattr(settings, 'CHAT_BATCH_MAX_SIZE', 200),
+            max_retries=getattr(settings, 'CHAT_BATCH_MAX_RETRIES', 3),
+        )
+    return _writer
+
+def drain_message_writer():
+    if _writer is not None:
+        _writer.drain()
+
+atexit.register(drain_message_writer)
+
+@chat_db
+def create_message(conversation, sender, content):
+    return Message.objects.create(conversation=conversation, sender=sender, content=content)
+
+async def save_message(conversation, sender, content):
+    writer = get_message_writer()
+    if writer is not None:
+        return await writer.save(conversation, sender, content)
+    return await create_message(conversation, sender, content)
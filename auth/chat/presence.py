@@ -0,0 +1,66 @@
+import time
+from django.conf import settings
+from .redis_client import get_redis, get_sync_redis
+
+def conversation_key(conversation_id):
+    return f'presence:conversation:{conversation_id}'
+
+def user_key(user_id):
+    return f'presence:user:{user_id}'
+
+def presence_ttl():
+    return getattr(settings, 'CHAT_PRESENCE_TTL', 60)
+
+def _live_in_conversation(members, conversation_id):
+    prefix = f'{conversation_id}:'
+    return any(member.startswith(prefix) for member in members)
+
+class PresenceService:
+    def __init__(self, client=None):
+        self.client = client or get_redis()
+        self.ttl = presence_ttl()
+
+    async def join(self, conversation_id, user_id, channel_name):
+        now = time.time()
+        expires = now + self.ttl
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.zremrangebyscore(user_key(user_id), '-inf', now)
+            pipe.zrangebyscore(user_key(user_id), now, '+inf')
+            pipe.zadd(user_key(user_id), {f'{conversation_id}:{channel_name}': expires})
+            pipe.expire(user_key(user_id), self.ttl)
+            pipe.zadd(conversation_key(conversation_id), {user_id: expires}, gt=True)
+            pipe.expire(conversation_key(conversation_id), self.ttl)
+            _, live, *_ = await pipe.execute()
+        return not _live_in_conversation(live, conversation_id)
+
+    async def heartbeat(self, conversation_id, user_id, channel_name):
+        now = time.time()
+        expires = now + self.ttl
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.zadd(user_key(user_id), {f'{conversation_id}:{channel_name}': expires})
+            pipe.expire(user_key(user_id), self.ttl)
+            pipe.zadd(conversation_key(conversation_id), {user_id: expires}, gt=True)
+            pipe.expire(conversation_key(conversation_id), self.ttl)
+            pipe.zrangebyscore(conversation_key(conversation_id), '-inf', now)
+            pipe.zremrangebyscore(conversation_key(conversation_id), '-inf', now)
+            results = await pipe.execute()
+        return [int(member) for member in results[-2]]
+
+    async def leave(self, conversation_id, user_id, channel_name):
+        now = time.time()
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.zrem(user_key(user_id), f'{conversation_id}:{channel_name}')
+            pipe.zrangebyscore(user_key(user_id), now, '+inf')
+            _, live = await pipe.execute()
+        if _live_in_conversation(live, conversation_id):
+            return False
+        await self.client.zrem(conversation_key(conversation_id), user_id)
+        return True
+
+    async def online(self, conversation_id):
+        members = await self.client.zrangebyscore(conversation_key(conversation_id), time.time(), '+inf')
+        return [int(member) for member in members]
+
+def online_users(conversation_id):
+    members = get_sync_redis().zrangebyscore(conversation_key(conversation_id), time.time(), '+inf')
+    return [int(member) for member in members]
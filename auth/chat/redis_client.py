@@ -0,0 +1,22 @@
+import asyncio
+import weakref
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+_async_clients = weakref.WeakKeyDictionary()
+_sync_client = None
+
+def get_redis():
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = aioredis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, decode_responses=True)
+        _async_clients[loop] = client
+    return client
+
+def get_sync_redis():
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, decode_responses=True)
+    return _sync_client
@@ -0,0 +1,90 @@
+import re
+from django.db import connection
+from django.utils.html import escape
+from .models import ConversationParticipant, Message
+
+FTS_TABLE = 'chat_message_fts'
+SEARCH_CONFIG = 'english'
+MARK_START = '\x02'
+MARK_STOP = '\x03'
+
+def fts5_query(query):
+    terms = re.findall(r'\w+', query)
+    return ' '.join(f'"{term}"' for term in terms)
+
+def highlight(snippet):
+    return escape(snippet).replace(MARK_START, '<mark>').replace(MARK_STOP, '</mark>')
+
+def _scope(user_id, conversation_id):
+    sql = f"m.conversation_id IN (SELECT conversation_id FROM {ConversationParticipant._meta.db_table} WHERE user_id = %s)"
+    params = [user_id]
+    if conversation_id is not None:
+        sql += " AND m.conversation_id = %s"
+        params.append(conversation_id)
+    return sql, params
+
+def _postgres_hits(query, user_id, conversation_id, after, limit):
+    scope, params = _scope(user_id, conversation_id)
+    keyset = ''
+    if after:
+        keyset = "WHERE rank < %s::real OR (rank = %s::real AND id < %s)"
+        params += [after[0], after[0], after[1]]
+    headline = f"StartSel={MARK_START}, StopSel={MARK_STOP}, MaxFragments=2, MaxWords=20, MinWords=5, FragmentDelimiter=\" … \""
+    sql = (
+        f"SELECT id, rank, ts_headline(%s, content, tsq, %s) FROM ("
+        f"SELECT * FROM ("
+        f"SELECT m.id, m.content, tsq, ts_rank(m.search_vector, tsq) AS rank "
+        f"FROM {Message._meta.db_table} m, websearch_to_tsquery(%s, %s) AS tsq "
+        f"WHERE m.search_vector @@ tsq AND {scope}"
+        f") AS hits {keyset} ORDER BY rank DESC, id DESC LIMIT %s"
+        f") AS page ORDER BY rank DESC, id DESC"
+    )
+    return sql, [SEARCH_CONFIG, headline, SEARCH_CONFIG, query] + params + [limit]
+
+def _sqlite_hits(query, user_id, conversation_id, after, limit):
+    scope, params = _scope(user_id, conversation_id)
+    keyset = ''
+    if after:
+        keyset = "WHERE rank < %s OR (rank = %s AND id < %s)"
+        params += [after[0], after[0], after[1]]
+    sql = (
+        f"SELECT id, rank, snippet FROM ("
+        f"SELECT m.id AS id, -bm25({FTS_TABLE}) AS rank, snippet({FTS_TABLE}, 0, char(2), char(3), '…', 16) AS snippet "
+        f"FROM {FTS_TABLE} JOIN {Message._meta.db_table} m ON m.id = {FTS_TABLE}.rowid "
+        f"WHERE {FTS_TABLE} MATCH %s AND {scope}"
+        f") AS hits {keyset} ORDER BY rank DESC, id DESC LIMIT %s"
+    )
+    return sql, [fts5_query(query)] + params + [limit]
+
+def _fallback_hits(query, user_id, conversation_id, after, limit):
+    messages = Message.objects.filter(conversation__participants__id=user_id, content__icontains=query)
+    if conversation_id is not None:
+        messages = messages.filter(conversation_id=conversation_id)
+    if after:
+        messages = messages.filter(id__lt=after[1])
+    return [(pk, 0.0, content[:200]) for pk, content in messages.order_by('-id').values_list('id', 'content')[:limit]]
+
+def search_messages(user_id, query, limit, after=None, conversation_id=None):
+    if connection.vendor == 'postgresql':
+        sql, params = _postgres_hits(query, user_id, conversation_id, after, limit)
+    elif connection.vendor == 'sqlite':
+        if not fts5_query(query):
+            return []
+        sql, params = _sqlite_hits(query, user_id, conversation_id, after, limit)
+    else:
+        hits = _fallback_hits(query, user_id, conversation_id, after, limit)
+        sql = None
+    if sql is not None:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            hits = cursor.fetchall()
+    messages = Message.objects.select_related('sender').in_bulk([pk for pk, _, _ in hits])
+    results = []
+    for pk, rank, snippet in hits:
+        message = messages.get(pk)
+        if message is None:
+            continue
+        message.rank = float(rank)
+        message.snippet = highlight(snippet)
+        results.append(message)
+    return results
@@ -1,8 +1,8 @@
 from rest_framework import serializers
 from account.models import User
-from .models import Conversation, Message
+from .models import Conversation, ConversationParticipant, Message
 from django.db import models  
-from django.db.models import Count, Q
+from django.db.models import Q
 
 class UserListSerializer(serializers.ModelSerializer):
     class Meta:
@@ -15,8 +15,8 @@ class MessageSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Message
-        fields = ('id', 'conversation', 'sender', 'content', 'timestamp', 'is_read', 'edited_at')
-        read_only_fields = ('id', 'sender', 'timestamp', 'conversation', 'is_read', 'edited_at')
+        fields = ('id', 'conversation', 'seq', 'sender', 'content', 'timestamp', 'is_read', 'edited_at')
+        read_only_fields = ('id', 'seq', 'sender', 'timestamp', 'conversation', 'is_read', 'edited_at')
 
 class CreateMessageSerializer(serializers.ModelSerializer):
     class Meta:
@@ -30,6 +30,20 @@ class CreateMessageSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Message too long (max 5000 characters)")
         return value.strip()
 
+class MessageSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(min_length=2, max_length=200, help_text="Words to search for in message content")
+    conversation = serializers.IntegerField(min_value=1, required=False, help_text="Restrict the search to one conversation")
+
+class MessageSearchResultSerializer(MessageSerializer):
+    rank = serializers.FloatField(read_only=True)
+    snippet = serializers.CharField(read_only=True, help_text="HTML-escaped excerpt with matches wrapped in <mark> tags")
+
+    class Meta(MessageSerializer.Meta):
+        fields = MessageSerializer.Meta.fields + ('rank', 'snippet')
+
+class ReadReceiptSerializer(serializers.Serializer):
+    message_id = serializers.IntegerField(min_value=1, help_text="Mark every message up to and including this one as read")
+
 class ConversationSerializer(serializers.ModelSerializer):
     participants = UserListSerializer(many=True, read_only=True)
     last_message = serializers.SerializerMethodField()
@@ -41,7 +55,7 @@ class ConversationSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created_at', 'updated_at', 'is_group')
 
     def get_last_message(self, obj):
-        last_msg = obj.messages.order_by('-timestamp').first()
+        last_msg = obj.last_message
         if last_msg:
             return {
                 'id': last_msg.id,
@@ -52,9 +66,12 @@ class ConversationSerializer(serializers.ModelSerializer):
         return None
     
     def get_unread_count(self, obj):
+        if hasattr(obj, 'unread_count'):
+            return obj.unread_count or 0
         request = self.context.get('request')
         if request and request.user:
-            return obj.messages.filter(is_read=False).exclude(sender=request.user).count()
+            membership = ConversationParticipant.objects.filter(conversation=obj, user=request.user).only('unread_count').first()
+            return membership.unread_count if membership else 0
         return 0
 
 class ConversationDetailSerializer(serializers.ModelSerializer):
@@ -67,7 +84,7 @@ class ConversationDetailSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created_at', 'is_group')
     
     def get_messages(self, obj):
-        messages = obj.messages.order_by('-timestamp')[:50]
+        messages = obj.messages.select_related('sender').order_by('-timestamp')[:50]
         return MessageSerializer(messages, many=True).data
 
 class CreateConversationSerializer(serializers.Serializer):
@@ -87,17 +104,10 @@ class CreateConversationSerializer(serializers.Serializer):
         request_user = self.context['request'].user
         if request_user.id not in participant_ids:
             participant_ids.append(request_user.id)
-        existing_conv = None    
         if len(participant_ids) == 2:
-            existing_conv = Conversation.objects.filter(
-            participants__id=participant_ids[0]).filter(
-            participants__id=participant_ids[1]).annotate(
-            participant_count=Count('participants')).filter(
-            participant_count=2).first()
-        
-        if existing_conv:
-            return existing_conv
-        
+            conversation, _ = Conversation.objects.get_or_create_direct(*participant_ids, name=name)
+            return conversation
+
         conversation = Conversation.objects.create(name=name,is_group=(len(participant_ids) > 2))
         conversation.participants.set(participant_ids)
         return conversation
\ No newline at end of file
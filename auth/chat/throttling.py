@@ -0,0 +1,71 @@
+import time
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def consume(self, amount=1):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < amount:
+            return False
+        self.tokens -= amount
+        return True
+
+class KeyedTokenBuckets:
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets = {}
+
+    def allow(self, key):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.max_keys:
+                self.buckets.clear()
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.burst)
+        return bucket.consume()
+
+TOKEN_BUCKET_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local amount = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= amount then
+    tokens = tokens - amount
+    allowed = 1
+else
+    retry_after = (amount - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(retry_after)}
+"""
+
+def rate_limit_key(user_id, event_type):
+    return f'ratelimit:{user_id}:{event_type}'
+
+class RedisRateLimiter:
+    def __init__(self, client, limits):
+        self.limits = limits
+        self.script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def consume(self, user_id, event_type, amount=1):
+        limit = self.limits.get(event_type)
+        if limit is None:
+            return True, 0.0
+        rate, burst = limit
+        allowed, retry_after = await self.script(keys=[rate_limit_key(user_id, event_type)], args=[rate, burst, amount])
+        return bool(allowed), float(retry_after)
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import (ConversationListCreateView,ConversationDetailView,MessageListCreateView,MessageRetrieveUpdateDestroyView)
+from .views import (ConversationListCreateView,ConversationDetailView,MessageListCreateView,MessageRetrieveUpdateDestroyView,ConversationReadView,ConversationPresenceView,ChatMetricsView,MessageSearchView)
 
 app_name = 'chat'
 
@@ -7,5 +7,9 @@ urlpatterns = [
     path('conversations/', ConversationListCreateView.as_view(),name='conversation-list-create'),
     path('conversations/<int:pk>/',ConversationDetailView.as_view(), name='conversation-detail'),
     path('conversations/<int:conversation_id>/messages/', MessageListCreateView.as_view(), name='message-list-create'),
+    path('conversations/<int:conversation_id>/read/', ConversationReadView.as_view(), name='conversation-read'),
+    path('conversations/<int:conversation_id>/presence/', ConversationPresenceView.as_view(), name='conversation-presence'),
     path('conversations/<int:conversation_id>/messages/<int:pk>/', MessageRetrieveUpdateDestroyView.as_view(), name='message-detail'),
+    path('messages/search/', MessageSearchView.as_view(), name='message-search'),
+    path('metrics/', ChatMetricsView.as_view(), name='chat-metrics'),
 ]
\ No newline at end of file
@@ -0,0 +1,41 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+import logging
+from .wire import encode_frames
+
+logger = logging.getLogger(__name__)
+
+def conversation_group_name(conversation_id):
+    return f'chat_{conversation_id}'
+
+def user_group_name(user_id):
+    return f'user_{user_id}'
+
+def conversation_event(event_type, conversation_id, payload, frame_type=None, **meta):
+    frames = encode_frames({'type': frame_type or event_type, 'conversation_id': conversation_id, **payload})
+    return {'type': event_type, 'conversation_id': conversation_id, 'frames': frames, **meta}
+
+def send_to_conversation(conversation_id, event):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(conversation_group_name(conversation_id), event)
+    except Exception as e:
+        logger.error(f"Failed to broadcast {event['type']} for conversation {conversation_id}: {e}", exc_info=True)
+
+def notify_membership_change(conversation_id):
+    send_to_conversation(conversation_id, {'type': 'membership_changed', 'conversation_id': conversation_id})
+
+def broadcast_read_receipt(conversation_id, user_id, message_id):
+    send_to_conversation(conversation_id, conversation_event('read_receipt', conversation_id, {'message_id': message_id, 'user_id': user_id}))
+
+def notify_conversation_added(conversation_id, user_ids):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    for user_id in user_ids:
+        try:
+            async_to_sync(channel_layer.group_send)(user_group_name(user_id), {'type': 'conversation_added', 'conversation_id': conversation_id})
+        except Exception as e:
+            logger.error(f"Failed to notify user {user_id} of conversation {conversation_id}: {e}", exc_info=True)
@@ -1,15 +1,26 @@
 from rest_framework import generics, status
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from django.shortcuts import get_object_or_404
-from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
 from drf_spectacular.utils import extend_schema,OpenApiExample,OpenApiResponse
 from drf_spectacular.types import OpenApiTypes
-from django.db.models import Count, Q
+from django.db import transaction
+from django.db.models import F, FilteredRelation, Q
 from account.models import User
-from .models import Conversation, Message
-from .serializers import (ConversationSerializer, MessageSerializer, CreateMessageSerializer,CreateConversationSerializer,ConversationDetailSerializer)
+from .models import Conversation, ConversationParticipant, Message
+from .serializers import (ConversationSerializer, MessageSerializer, CreateMessageSerializer,CreateConversationSerializer,ConversationDetailSerializer,ReadReceiptSerializer,MessageSearchQuerySerializer,MessageSearchResultSerializer)
 from django.utils import timezone
+from django.conf import settings
+from .utils import broadcast_read_receipt, notify_conversation_added, notify_membership_change
+from .pagination import MessageKeysetPagination, MessageSearchPagination
+from .search import search_messages
+from .presence import online_users
+from .metrics import read_metrics
+from redis.exceptions import RedisError
+import logging
+
+logger = logging.getLogger(__name__)
 
 class ConversationListCreateView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
@@ -19,7 +30,8 @@ class ConversationListCreateView(generics.ListCreateAPIView):
         return ConversationSerializer
 
     def get_queryset(self):
-        return Conversation.objects.filter(participants=self.request.user).prefetch_related('participants', 'messages').annotate(message_count=Count('messages')).order_by('-updated_at')
+        membership = FilteredRelation('memberships', condition=Q(memberships__user=self.request.user))
+        return Conversation.objects.annotate(membership=membership).filter(membership__isnull=False).annotate(unread_count=F('membership__unread_count')).select_related('last_message__sender').order_by('-updated_at')
     
     @extend_schema(
         summary="List user's conversations",
@@ -152,6 +164,7 @@ class ConversationListCreateView(generics.ListCreateAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         conversation = serializer.save()
+        notify_conversation_added(conversation.id, conversation.participants.values_list('id', flat=True))
         response_serializer = ConversationSerializer(conversation, context={'request': request})
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
 
@@ -276,17 +289,22 @@ class ConversationDetailView(generics.RetrieveDestroyAPIView):
     )
     def delete(self, request, *args, **kwargs):
         conversation = self.get_object()
+        conversation_id = conversation.id
         conversation.participants.remove(request.user)
+        if conversation.dm_key:
+            Conversation.objects.filter(pk=conversation_id).update(dm_key=None)
         if conversation.participants.count() == 0:
             conversation.delete()
+        notify_membership_change(conversation_id)
         return Response(status=status.HTTP_200_OK)
 
 class MessageListCreateView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
+    pagination_class = MessageKeysetPagination
     def get_queryset(self):
         conversation_id = self.kwargs['conversation_id']
         conversation = self.get_conversation(conversation_id)
-        return Message.objects.filter(conversation=conversation).select_related('sender').order_by('timestamp')
+        return Message.objects.filter(conversation=conversation).select_related('sender')
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return CreateMessageSerializer
@@ -294,7 +312,7 @@ class MessageListCreateView(generics.ListCreateAPIView):
 
     @extend_schema(
     summary="List messages",
-    description="Retrieve all messages from a conversation.",
+    description="Retrieve a page of messages from a conversation in chronological order. Without a cursor the latest page is returned; pass the returned `before` cursor to load older messages or `after` to load newer ones.",
     tags=["Chat - Conversations"],
     responses={
         200: OpenApiResponse(
@@ -304,17 +322,20 @@ class MessageListCreateView(generics.ListCreateAPIView):
                 OpenApiExample(
                     name="Success Response",
                     value={
-                        "status": "success",
-                        "message": "Messages retrieved successfully.",
-                        "data": [
+                        "has_more": True,
+                        "before": "MjAyNS0xMS0wNVQwOTo0NTowMCswMDowMHwx",
+                        "after": "MjAyNS0xMS0wNVQwOTo0NjowMCswMDowMHwy",
+                        "results": [
                             {
                                 "id": 1,
+                                "seq": 1,
                                 "sender": {"id": 2, "email": "friend@example.com"},
                                 "content": "Hey, ready for the trip?",
                                 "timestamp": "2025-11-05T09:45:00Z"
                             },
                             {
                                 "id": 2,
+                                "seq": 2,
                                 "sender": {"id": 1, "email": "you@example.com"},
                                 "content": "Yes, let's go!",
                                 "timestamp": "2025-11-05T09:46:00Z"
@@ -374,6 +395,7 @@ class MessageListCreateView(generics.ListCreateAPIView):
                         "message": "Message sent successfully.",
                         "data": {
                             "id": 45,
+                            "seq": 45,
                             "sender": {"id": 1, "email": "you@example.com"},
                             "content": "What time are we leaving?",
                             "timestamp": "2025-11-05T11:00:00Z"
@@ -449,6 +471,7 @@ class MessageRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
                         "message": "Message retrieved successfully.",
                         "data": {
                             "id": 23,
+                            "seq": 23,
                             "sender": {"id": 2, "email": "friend@example.com"},
                             "content": "Don't forget snacks!",
                             "timestamp": "2025-11-05T08:00:00Z"
@@ -618,4 +641,228 @@ class MessageRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     def perform_destroy(self, instance):
         if instance.sender != self.request.user:
             raise PermissionDenied('You can only delete your own messages')
-        instance.delete()
\ No newline at end of file
+        conversation = instance.conversation
+        was_last = conversation.last_message_id == instance.id
+        with transaction.atomic():
+            ConversationParticipant.objects.forget_unread(instance)
+            instance.delete()
+        if was_last:
+            conversation.refresh_last_message()
+
+class MessageSearchView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = MessageSearchResultSerializer
+    pagination_class = MessageSearchPagination
+
+    @extend_schema(
+    summary="Search messages",
+    description="Full-text search over the messages of every conversation the authenticated user participates in, optionally restricted to one conversation. Results are ordered by relevance and carry a highlighted snippet. Pass the returned `after` cursor to load the next page.",
+    tags=["Chat - Conversations"],
+    parameters=[MessageSearchQuerySerializer],
+    responses={
+        200: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Search results retrieved successfully",
+            examples=[
+                OpenApiExample(
+                    name="Success Response",
+                    value={
+                        "has_more": True,
+                        "after": "MC4wNjA3OTI3fDQ1",
+                        "results": [
+                            {
+                                "id": 45,
+                                "conversation": 3,
+                                "seq": 45,
+                                "sender": {"id": 2, "email": "friend@example.com"},
+                                "content": "Booked the houseboat in Kerala for Friday",
+                                "timestamp": "2025-11-05T11:00:00Z",
+                                "rank": 0.0607927,
+                                "snippet": "Booked the houseboat in <mark>Kerala</mark> for Friday"
+                            }
+                        ]
+                    }
+                )
+            ]
+        ),
+        400: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Invalid search query",
+            examples=[
+                OpenApiExample(
+                    name="Validation Error",
+                    value={"q": ["Ensure this field has at least 2 characters."]}
+                )
+            ]
+        ),
+    },
+    )
+    def get(self, request):
+        query = MessageSearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        def search(limit, after):
+            return search_messages(request.user.id, query.validated_data['q'], limit, after=after, conversation_id=query.validated_data.get('conversation'))
+        page = self.paginator.paginate_search(search, request)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+class ConversationReadView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = ReadReceiptSerializer
+
+    @extend_schema(
+    summary="Mark conversation read",
+    description="Move the authenticated user's read watermark forward to the given message. Every earlier message counts as read and the unread counter is recomputed in one update. A read receipt is broadcast to connected participants when the watermark advances.",
+    tags=["Chat - Conversations"],
+    request=ReadReceiptSerializer,
+    responses={
+        200: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Read watermark applied",
+            examples=[
+                OpenApiExample(
+                    name="Success Response",
+                    value={"last_read_message": 45, "unread_count": 0, "advanced": True}
+                )
+            ]
+        ),
+        403: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="User not a participant of this conversation",
+            examples=[
+                OpenApiExample(
+                    name="Forbidden",
+                    value={"detail": "You are not a participant of this conversation"}
+                )
+            ]
+        ),
+        404: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Message not found in this conversation",
+            examples=[
+                OpenApiExample(
+                    name="Not Found",
+                    value={"detail": "Message not found in this conversation"}
+                )
+            ]
+        ),
+    },
+    )
+    def post(self, request, conversation_id):
+        membership = ConversationParticipant.objects.filter(conversation_id=conversation_id, user=request.user).first()
+        if membership is None:
+            get_object_or_404(Conversation, id=conversation_id)
+            raise PermissionDenied('You are not a participant of this conversation')
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        message_id = serializer.validated_data['message_id']
+        advanced = ConversationParticipant.objects.read_up_to(conversation_id, request.user.id, message_id)
+        if advanced is None:
+            raise NotFound('Message not found in this conversation')
+        if advanced:
+            broadcast_read_receipt(conversation_id, request.user.id, message_id)
+        membership.refresh_from_db(fields=['last_read_message', 'unread_count'])
+        return Response({'last_read_message': membership.last_read_message_id, 'unread_count': membership.unread_count, 'advanced': bool(advanced)})
+
+class ConversationPresenceView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+    summary="Get conversation presence",
+    description="List the participants of a conversation that currently hold a live websocket connection to it. Presence expires automatically when a client stops sending heartbeats.",
+    tags=["Chat - Conversations"],
+    responses={
+        200: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Presence retrieved successfully",
+            examples=[
+                OpenApiExample(
+                    name="Success Response",
+                    value={"conversation_id": 3, "online": [1, 2]}
+                )
+            ]
+        ),
+        403: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="User not a participant of this conversation",
+            examples=[
+                OpenApiExample(
+                    name="Forbidden",
+                    value={"detail": "You are not a participant of this conversation"}
+                )
+            ]
+        ),
+        503: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Presence store unavailable",
+            examples=[
+                OpenApiExample(
+                    name="Unavailable",
+                    value={"detail": "Presence service unavailable"}
+                )
+            ]
+        ),
+    },
+    )
+    def get(self, request, conversation_id):
+        conversation = get_object_or_404(Conversation, id=conversation_id)
+        if not conversation.is_participant(request.user):
+            raise PermissionDenied('You are not a participant of this conversation')
+        try:
+            online = online_users(conversation_id)
+        except RedisError as e:
+            logger.error(f"Failed to read presence for conversation {conversation_id}: {e}")
+            return Response({'detail': 'Presence service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({'conversation_id': conversation_id, 'online': online})
+
+class ChatMetricsView(generics.GenericAPIView):
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+    summary="Get chat metrics",
+    description="Return the chat counters aggregated across all websocket workers, such as typing indicators received, emitted, expired and suppressed by the debounce or the per-room fan-out limit, and frames allowed or rejected by the per-user rate limits. Counters are flushed to Redis periodically by each worker. The configured rate limits (tokens per second and burst) are returned alongside. Staff only.",
+    tags=["Chat - Metrics"],
+    responses={
+        200: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Metrics retrieved successfully",
+            examples=[
+                OpenApiExample(
+                    name="Success Response",
+                    value={
+                        "metrics": {"rate_limit.chat_message.allowed": 4210, "rate_limit.chat_message.limited": 12, "typing.emitted": 120, "typing.expired": 4, "typing.received": 980, "typing.suppressed_duplicate": 850, "typing.suppressed_room_limit": 6},
+                        "rate_limits": {"chat_message": {"rate": 2.0, "burst": 20}, "typing": {"rate": 2.0, "burst": 10}}
+                    }
+                )
+            ]
+        ),
+        403: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="User is not staff",
+            examples=[
+                OpenApiExample(
+                    name="Forbidden",
+                    value={"detail": "You do not have permission to perform this action."}
+                )
+            ]
+        ),
+        503: OpenApiResponse(
+            response=OpenApiTypes.OBJECT,
+            description="Metrics store unavailable",
+            examples=[
+                OpenApiExample(
+                    name="Unavailable",
+                    value={"detail": "Metrics service unavailable"}
+                )
+            ]
+        ),
+    },
+    )
+    def get(self, request):
+        try:
+            counters = read_metrics()
+        except RedisError as e:
+            logger.error(f"Failed to read chat metrics: {e}")
+            return Response({'detail': 'Metrics service unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        limits = {event_type: {'rate': rate, 'burst': burst} for event_type, (rate, burst) in getattr(settings, 'CHAT_RATE_LIMITS', {}).items()}
+        return Response({'metrics': counters, 'rate_limits': limits})
@@ -0,0 +1,25 @@
+import json
+import msgpack
+
+JSON = 'json'
+MSGPACK = 'msgpack'
+
+def negotiate(subprotocols):
+    if MSGPACK in subprotocols:
+        return MSGPACK
+    if JSON in subprotocols:
+        return JSON
+    return None
+
+def encode(payload, protocol):
+    if protocol == MSGPACK:
+        return msgpack.packb(payload)
+    return json.dumps(payload)
+
+def decode(data, protocol):
+    if protocol == MSGPACK:
+        return msgpack.unpackb(data)
+    return json.loads(data)
+
+def encode_frames(payload):
+    return {JSON: encode(payload, JSON), MSGPACK: encode(payload, MSGPACK)}
@@ -0,0 +1,25 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from community.models import VideoUpload
+from community.uploads import discard
+
+class Command(BaseCommand):
+    help = 'Delete resumable video uploads that were abandoned or finished, along with their partial files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=getattr(settings, 'CHUNKED_UPLOAD_EXPIRY_HOURS', 24), help='Purge unfinished uploads idle for more than this many hours')
+
+    def handle(self, *args, **options):
+        if options['older_than'] < 1:
+            raise CommandError('--older-than must be at least 1 hour')
+        cutoff = timezone.now() - timedelta(hours=options['older_than'])
+        stale = VideoUpload.objects.filter(completed__isnull=True, updated__lt=cutoff)
+        purged = 0
+        for upload in stale.iterator():
+            discard(upload)
+            upload.delete()
+            purged += 1
+        finished = VideoUpload.objects.filter(completed__lt=cutoff).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f'{purged} abandoned and {finished} finished uploads purged'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from community.models import Comment, Post
+
+class Command(BaseCommand):
+    help = 'Repair drift in the like, dislike and comment counters stored on posts and the reply counters stored on comments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Posts checked per query')
+        parser.add_argument('--dry-run', action='store_true', help='Only report posts whose counters have drifted')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+        last_id, checked, repaired, replies = 0, 0, 0, 0
+        while True:
+            ids = list(Post.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            last_id = ids[-1]
+            checked += len(ids)
+            comments = Comment.objects.filter(post_id__in=ids)
+            if options['dry_run']:
+                repaired += Post.objects.drifted(ids).count()
+                replies += comments.reply_count_drifted().count()
+            else:
+                repaired += Post.objects.reconcile_counters(ids)
+                replies += comments.reconcile_reply_counts()
+        outcome = 'drifted' if options['dry_run'] else 'repaired'
+        self.stdout.write(self.style.SUCCESS(f'{checked} posts checked, {repaired} {outcome}; {replies} comment reply counts {outcome}'))
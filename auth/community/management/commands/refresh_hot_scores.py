@@ -0,0 +1,25 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from community.models import Post
+
+class Command(BaseCommand):
+    help = 'Recompute the hot score of recent posts whose stored score has drifted; run periodically from cron'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=getattr(settings, 'COMMUNITY_HOT_WINDOW_HOURS', 168), help='Recompute posts created within this many hours')
+        parser.add_argument('--batch-size', type=int, default=500, help='Posts recomputed per UPDATE')
+
+    def handle(self, *args, **options):
+        if options['hours'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--hours and --batch-size must be at least 1')
+        recent = Post.objects.filter(created__gte=timezone.now() - timedelta(hours=options['hours'])).order_by('pk')
+        last_id, refreshed = 0, 0
+        while True:
+            ids = list(recent.filter(pk__gt=last_id).values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            last_id = ids[-1]
+            refreshed += Post.objects.refresh_hot_scores(Post.objects.filter(pk__in=ids))
+        self.stdout.write(self.style.SUCCESS(f'{refreshed} posts refreshed'))
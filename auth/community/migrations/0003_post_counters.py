@@ -0,0 +1,43 @@
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Post = apps.get_model('community', 'Post')
+    PostLike = apps.get_model('community', 'PostLike')
+    Comment = apps.get_model('community', 'Comment')
+    def counted(queryset):
+        return Coalesce(Subquery(queryset.order_by().values('post').annotate(total=Count('pk')).values('total'), output_field=IntegerField()), 0)
+    likes = PostLike.objects.filter(post=OuterRef('pk'))
+    Post.objects.update(
+        like_count=counted(likes.filter(like=True)),
+        dislike_count=counted(likes.filter(like=False)),
+        comment_count=counted(Comment.objects.filter(post=OuterRef('pk'))),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0002_post_feed_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='dislike_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
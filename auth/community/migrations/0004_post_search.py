@@ -0,0 +1,52 @@
+from django.db import migrations
+
+POSTGRES_FORWARD = [
+    "ALTER TABLE community_post ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(\"desc\", '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(loc, '')), 'C')) STORED",
+    "CREATE INDEX community_post_search_vector_gin ON community_post USING GIN (search_vector)",
+]
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS community_post_search_vector_gin",
+    "ALTER TABLE community_post DROP COLUMN IF EXISTS search_vector",
+]
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE community_post_fts USING fts5(title, \"desc\", loc, content='community_post', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER community_post_fts_ai AFTER INSERT ON community_post BEGIN "
+    "INSERT INTO community_post_fts(rowid, title, \"desc\", loc) VALUES (new.id, new.title, new.\"desc\", new.loc); END",
+    "CREATE TRIGGER community_post_fts_ad AFTER DELETE ON community_post BEGIN "
+    "INSERT INTO community_post_fts(community_post_fts, rowid, title, \"desc\", loc) VALUES ('delete', old.id, old.title, old.\"desc\", old.loc); END",
+    "CREATE TRIGGER community_post_fts_au AFTER UPDATE OF title, \"desc\", loc ON community_post BEGIN "
+    "INSERT INTO community_post_fts(community_post_fts, rowid, title, \"desc\", loc) VALUES ('delete', old.id, old.title, old.\"desc\", old.loc); "
+    "INSERT INTO community_post_fts(rowid, title, \"desc\", loc) VALUES (new.id, new.title, new.\"desc\", new.loc); END",
+    "INSERT INTO community_post_fts(community_post_fts) VALUES ('rebuild')",
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS community_post_fts_au",
+    "DROP TRIGGER IF EXISTS community_post_fts_ad",
+    "DROP TRIGGER IF EXISTS community_post_fts_ai",
+    "DROP TABLE IF EXISTS community_post_fts",
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for statement in statements.get(vendor, []):
+            schema_editor.execute(statement)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0003_post_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run({'postgresql': POSTGRES_REVERSE, 'sqlite': SQLITE_REVERSE}),
+        ),
+    ]
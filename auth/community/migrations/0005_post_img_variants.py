@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0004_post_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='img_variants',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,57 @@
+import math
+from datetime import datetime, timezone
+from django.db import migrations, models
+
+HOT_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+HOT_DECAY_SECONDS = 45000
+HOT_COMMENT_WEIGHT = 0.5
+
+SQLITE_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS community_post_fts_ai AFTER INSERT ON community_post BEGIN "
+    "INSERT INTO community_post_fts(rowid, title, \"desc\", loc) VALUES (new.id, new.title, new.\"desc\", new.loc); END",
+    "CREATE TRIGGER IF NOT EXISTS community_post_fts_ad AFTER DELETE ON community_post BEGIN "
+    "INSERT INTO community_post_fts(community_post_fts, rowid, title, \"desc\", loc) VALUES ('delete', old.id, old.title, old.\"desc\", old.loc); END",
+    "CREATE TRIGGER IF NOT EXISTS community_post_fts_au AFTER UPDATE OF title, \"desc\", loc ON community_post BEGIN "
+    "INSERT INTO community_post_fts(community_post_fts, rowid, title, \"desc\", loc) VALUES ('delete', old.id, old.title, old.\"desc\", old.loc); "
+    "INSERT INTO community_post_fts(rowid, title, \"desc\", loc) VALUES (new.id, new.title, new.\"desc\", new.loc); END",
+]
+
+
+def restore_search_triggers(apps, schema_editor):
+    # SQLite rebuilds community_post to add a NOT NULL column, which drops its triggers.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in SQLITE_TRIGGERS:
+        schema_editor.execute(statement)
+
+
+def backfill_hot_score(apps, schema_editor):
+    Post = apps.get_model('community', 'Post')
+    posts = list(Post.objects.only('id', 'like_count', 'dislike_count', 'comment_count', 'created'))
+    for post in posts:
+        score = post.like_count - post.dislike_count + HOT_COMMENT_WEIGHT * post.comment_count + 1
+        sign = (score > 0) - (score < 0)
+        post.hot_score = sign * math.log10(max(abs(score), 1)) + (post.created - HOT_EPOCH).total_seconds() / HOT_DECAY_SECONDS
+    Post.objects.bulk_update(posts, ['hot_score'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0006_videoupload'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AddField(
+            model_name='post',
+            name='hot_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-hot_score', '-id'], name='community_post_hot_idx'),
+        ),
+        migrations.RunPython(backfill_hot_score, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_paths(apps, schema_editor):
+    Comment = apps.get_model('community', 'Comment')
+    batch = []
+    for comment in Comment.objects.only('id').order_by('id').iterator(chunk_size=1000):
+        comment.path = str(comment.pk).zfill(10)
+        batch.append(comment)
+        if len(batch) >= 1000:
+            Comment.objects.bulk_update(batch, ['path'])
+            batch = []
+    if batch:
+        Comment.objects.bulk_update(batch, ['path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0008_comment_page_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='community.comment'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=60),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='community_comment_page_idx',
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'depth', '-created', '-id'], name='community_comment_page_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='community_comment_path_idx'),
+        ),
+    ]
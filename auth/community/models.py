@@ -1,32 +1,239 @@
-from django.db import models
+import uuid
+from django.db import IntegrityError, models, transaction
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models import Count, Exists, F, IntegerField, OuterRef, Q, Subquery, Window
+from django.db.models.functions import Coalesce, RowNumber, Substr
+from django.utils import timezone
+from auth.sequences import reserve_ids
+from imaging.mixins import ImageVariantsMixin
+from .ranking import hot_score, hot_score_drifted, hot_score_sql
 
-class Post(models.Model):
+def count_subquery(queryset):
+    counted = queryset.order_by().values('post').annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+class PostManager(models.Manager):
+    def feed(self, user=None):
+        posts = self.get_queryset().select_related('user__profile')
+        if user is not None and user.is_authenticated:
+            likes = PostLike.objects.filter(post=OuterRef('pk'), user=user)
+            posts = posts.annotate(user_liked=Exists(likes.filter(like=True)), user_disliked=Exists(likes.filter(like=False)))
+        return posts
+    def adjust_counters(self, post_id, **deltas):
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        counters = {field: F(field) + delta for field, delta in deltas.items()}
+        fresh = hot_score_sql(**deltas)
+        if fresh is None:
+            if counters:
+                self.filter(pk=post_id).update(**counters)
+            return self.refresh_hot_score(post_id)
+        if not self.filter(pk=post_id).update(hot_score=fresh, **counters):
+            return None
+        return self.filter(pk=post_id).values('like_count', 'dislike_count', 'comment_count', 'hot_score').first()
+    def refresh_hot_score(self, post_id):
+        row = self.filter(pk=post_id).values('like_count', 'dislike_count', 'comment_count', 'created').first()
+        if row is None:
+            return None
+        row['hot_score'] = hot_score(row['like_count'], row['dislike_count'], row['comment_count'], row['created'])
+        self.filter(pk=post_id).update(hot_score=row['hot_score'])
+        return row
+    def refresh_hot_scores(self, posts):
+        fresh = hot_score_sql()
+        if fresh is not None:
+            return posts.filter(hot_score_drifted(fresh)).update(hot_score=fresh)
+        posts = list(posts.only('id', 'like_count', 'dislike_count', 'comment_count', 'created', 'hot_score'))
+        for post in posts:
+            post.hot_score = hot_score(post.like_count, post.dislike_count, post.comment_count, post.created)
+        self.bulk_update(posts, ['hot_score'], batch_size=500)
+        return len(posts)
+    def actual_counts(self):
+        likes = PostLike.objects.filter(post=OuterRef('pk'))
+        return {
+            'like_count': count_subquery(likes.filter(like=True)),
+            'dislike_count': count_subquery(likes.filter(like=False)),
+            'comment_count': count_subquery(Comment.objects.filter(post=OuterRef('pk'))),
+        }
+    def drifted(self, post_ids):
+        actual = {f'actual_{field}': count for field, count in self.actual_counts().items()}
+        return self.get_queryset().filter(pk__in=post_ids).annotate(**actual).filter(
+            ~Q(like_count=F('actual_like_count')) | ~Q(dislike_count=F('actual_dislike_count')) | ~Q(comment_count=F('actual_comment_count'))
+        )
+    def reconcile_counters(self, post_ids):
+        drifted = list(self.drifted(post_ids).values_list('pk', flat=True))
+        if drifted:
+            self.filter(pk__in=drifted).update(**self.actual_counts())
+            self.refresh_hot_scores(self.filter(pk__in=drifted))
+        return len(drifted)
+
+class Post(ImageVariantsMixin, models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='posts')
     title = models.CharField(max_length=50)
     desc = models.CharField(max_length=1000)
     loc = models.CharField(max_length=75, blank=True, null=True)
     rating = models.IntegerField(blank=True, null=True, validators=[MinValueValidator(0), MaxValueValidator(5)])
     img = models.ImageField(upload_to='images/', blank=True, null=True)
+    img_variants = models.JSONField(blank=True, null=True, editable=False)
     vid = models.FileField(upload_to='videos/', blank=True, null=True)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    dislike_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    hot_score = models.FloatField(default=0, editable=False)
+    objects = PostManager()
+    variant_fields = ('img',)
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(fields=['-created', '-id'], name='community_post_feed_idx'),
+            models.Index(fields=['-hot_score', '-id'], name='community_post_hot_idx'),
+        ]
     def __str__(self):
         return self.title
+    def maintained_fields(self):
+        return super().maintained_fields() | {'like_count', 'dislike_count', 'comment_count', 'hot_score'}
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.hot_score = hot_score(self.like_count, self.dislike_count, self.comment_count, self.created or timezone.now())
+        super().save(*args, **kwargs)
+
+COMMENT_PATH_WIDTH = 10
+COMMENT_MAX_DEPTH = 5
+COMMENT_THREAD_FIELDS = ('parent', 'path', 'depth', 'reply_count')
+
+def path_segment(pk):
+    return str(pk).zfill(COMMENT_PATH_WIDTH)
+
+def path_upper_bound(path):
+    if not path:
+        raise ValueError('Comment path is empty')
+    prefix = path.rstrip('9')
+    if not prefix:
+        return None
+    return prefix[:-1] + str(int(prefix[-1]) + 1)
+
+def subtree_range(path):
+    upper = path_upper_bound(path)
+    if upper is None:
+        return Q(path__gt=path, path__startswith=path)
+    return Q(path__gt=path, path__lt=upper)
+
+class CommentQuerySet(models.QuerySet):
+    def roots(self):
+        return self.filter(depth=0)
+    def subtree(self, path):
+        return self.filter(subtree_range(path))
+    def thread_replies(self, roots, per_thread):
+        if not roots or per_thread < 1:
+            return self.none()
+        ranges = Q()
+        for root in roots:
+            ranges |= subtree_range(root.path)
+        position = Window(RowNumber(), partition_by=[Substr('path', 1, COMMENT_PATH_WIDTH)], order_by=F('path').asc())
+        return self.filter(ranges).annotate(position=position).filter(position__lte=per_thread).order_by('path')
+    def actual_reply_count(self):
+        replies = Comment.objects.filter(parent=OuterRef('pk')).order_by().values('parent').annotate(total=Count('pk')).values('total')
+        return Coalesce(Subquery(replies, output_field=IntegerField()), 0)
+    def reply_count_drifted(self):
+        return self.annotate(actual_reply_count=self.actual_reply_count()).exclude(reply_count=F('actual_reply_count'))
+    def reconcile_reply_counts(self):
+        drifted = list(self.reply_count_drifted().values_list('pk', flat=True))
+        if drifted:
+            Comment.objects.filter(pk__in=drifted).update(reply_count=self.actual_reply_count())
+        return len(drifted)
+    def with_threads(self, roots, per_thread):
+        threads = {root.path: root for root in roots}
+        for root in roots:
+            root.thread_replies = []
+        for reply in self.thread_replies(roots, per_thread):
+            threads[reply.path[:COMMENT_PATH_WIDTH]].thread_replies.append(reply)
+        return roots
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='comments')
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
+    path = models.CharField(max_length=COMMENT_PATH_WIDTH * (COMMENT_MAX_DEPTH + 1), default='', editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
     text = models.TextField(max_length=500)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
+    objects = CommentQuerySet.as_manager()
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(fields=['post', 'depth', '-created', '-id'], name='community_comment_page_idx'),
+            models.Index(fields=['post', 'path'], name='community_comment_path_idx'),
+        ]
     def __str__(self):
         return str(self.user.id) + " commented on '" + self.post.title + "'"
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            if kwargs.get('update_fields') is None:
+                kwargs['update_fields'] = [f.name for f in self._meta.concrete_fields if not f.primary_key and f.name not in COMMENT_THREAD_FIELDS]
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            parent = self.parent
+            if parent is not None and parent.depth >= COMMENT_MAX_DEPTH:
+                parent = self.parent = parent.parent
+            self.depth = parent.depth + 1 if parent else 0
+            prefix = parent.path if parent else ''
+            if self.pk is None:
+                reserved = reserve_ids(Comment)
+                if reserved:
+                    self.pk = reserved[0]
+                    kwargs['force_insert'] = True
+            if self.pk is not None:
+                self.path = prefix + path_segment(self.pk)
+                super().save(*args, **kwargs)
+            else:
+                super().save(*args, **kwargs)
+                self.path = prefix + path_segment(self.pk)
+                Comment.objects.filter(pk=self.pk).update(path=self.path)
+            if parent is not None:
+                Comment.objects.filter(pk=parent.pk).update(reply_count=F('reply_count') + 1)
+            Post.objects.adjust_counters(self.post_id, comment_count=1)
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            removed, _ = Comment.objects.filter(post_id=self.post_id).subtree(self.path).delete()
+            if self.parent_id is not None:
+                Comment.objects.filter(pk=self.parent_id).update(reply_count=F('reply_count') - 1)
+            result = super().delete(*args, **kwargs)
+            Post.objects.adjust_counters(self.post_id, comment_count=-(removed + 1))
+        return result
+
+def reaction_field(like):
+    return 'like_count' if like else 'dislike_count'
+
+class PostLikeManager(models.Manager):
+    def toggle(self, post_id, user, like, retry=True):
+        try:
+            return self.apply_toggle(post_id, user, like)
+        except IntegrityError:
+            if not Post.objects.filter(pk=post_id).exists():
+                raise Post.DoesNotExist(f'Post {post_id} no longer exists')
+            if not retry or not self.filter(post_id=post_id, user=user).exists():
+                raise
+        return self.toggle(post_id, user, like, retry=False)
+    def apply_toggle(self, post_id, user, like):
+        with transaction.atomic():
+            existing = self.select_for_update().filter(post_id=post_id, user=user).first()
+            if existing is None:
+                self.create(post_id=post_id, user=user, like=like)
+                action, deltas = 'created', {reaction_field(like): 1}
+            elif existing.like == like:
+                existing.delete()
+                action, deltas = 'removed', {reaction_field(like): -1}
+            else:
+                existing.like = like
+                existing.save(update_fields=['like', 'updated'])
+                action, deltas = 'updated', {reaction_field(like): 1, reaction_field(not like): -1}
+            counts = Post.objects.adjust_counters(post_id, **deltas)
+            if counts is None:
+                raise Post.DoesNotExist(f'Post {post_id} no longer exists')
+        return action, counts
 
 class PostLike(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='likes')
@@ -34,6 +241,7 @@ class PostLike(models.Model):
     like = models.BooleanField()
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
+    objects = PostLikeManager()
     class Meta:
         unique_together = ('post', 'user')
         ordering = ['-created']
@@ -41,4 +249,21 @@ class PostLike(models.Model):
         if self.like:
             return str(self.user.id) + " liked the post '" + self.post.title + "'"
         else:
-            return str(self.user.id) + " disliked the post '" + self.post.title + "'"
\ No newline at end of file
+            return str(self.user.id) + " disliked the post '" + self.post.title + "'"
+
+class VideoUpload(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='video_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    checksum = models.CharField(max_length=64, blank=True, default='')
+    offset = models.PositiveBigIntegerField(default=0)
+    post = models.ForeignKey(Post, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    completed = models.DateTimeField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+    class Meta:
+        ordering = ['-created']
+        indexes = [models.Index(fields=['completed', 'updated'])]
+    def __str__(self):
+        return str(self.user_id) + " uploading '" + self.filename + "'"
@@ -0,0 +1,45 @@
+from rest_framework.response import Response
+from auth.pagination import KeysetPagination, RankedSearchPagination
+
+class PostKeysetPagination(KeysetPagination):
+    ordering_field = 'created'
+    page_size = 20
+    max_page_size = 50
+
+    def get_paginated_response(self, data, **extra):
+        return Response({'status': 'success', **extra, **self.get_cursors(), 'page_size': len(data), 'data': data})
+
+class PostHotPagination(PostKeysetPagination):
+    ordering_field = 'hot_score'
+
+class CommentKeysetPagination(PostKeysetPagination):
+    page_size = 20
+    max_page_size = 100
+    replies_per_thread = 3
+    max_replies_per_thread = 20
+    replies_query_param = 'replies'
+
+    def get_replies_per_thread(self, request):
+        try:
+            replies = int(request.query_params.get(self.replies_query_param, self.replies_per_thread))
+        except (TypeError, ValueError):
+            return self.replies_per_thread
+        return min(max(replies, 0), self.max_replies_per_thread)
+
+class CommentReplyPagination(CommentKeysetPagination):
+    ordering_field = 'path'
+    chronological = True
+
+    def paginate_replies(self, queryset, root, request):
+        before = self.decode_cursor(queryset.model, request.query_params.get('before'))
+        after = self.decode_cursor(queryset.model, request.query_params.get('after'))
+        if not before and not after:
+            after = (root.path, root.pk)
+        return self.paginate(queryset, self.get_limit(request), before=before, after=after)
+
+class PostSearchPagination(RankedSearchPagination):
+    page_size = 20
+    max_page_size = 50
+
+    def get_paginated_response(self, data, **extra):
+        return Response({'status': 'success', **extra, **self.get_cursors(), 'page_size': len(data), 'data': data})
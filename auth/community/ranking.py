@@ -0,0 +1,38 @@
+import math
+from datetime import datetime, timezone as dt_timezone
+from django.db import connection
+from django.db.models import ExpressionWrapper, F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Abs, Greatest, Log, Sign
+
+HOT_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+HOT_DECAY_SECONDS = 45000
+HOT_COMMENT_WEIGHT = 0.5
+HOT_TOLERANCE = 1e-6
+
+def engagement(likes, dislikes, comments):
+    return likes - dislikes + HOT_COMMENT_WEIGHT * comments + 1
+
+def hot_score(likes, dislikes, comments, created):
+    score = engagement(likes, dislikes, comments)
+    sign = (score > 0) - (score < 0)
+    return sign * math.log10(max(abs(score), 1)) + (created - HOT_EPOCH).total_seconds() / HOT_DECAY_SECONDS
+
+def created_seconds_sql():
+    if connection.vendor == 'postgresql':
+        return RawSQL('EXTRACT(EPOCH FROM "created")::float8', [], output_field=FloatField())
+    if connection.vendor == 'sqlite':
+        return RawSQL('(julianday("created") - 2440587.5) * 86400.0', [], output_field=FloatField())
+    return None
+
+def hot_score_sql(**deltas):
+    seconds = created_seconds_sql()
+    if seconds is None:
+        return None
+    likes, dislikes, comments = (F(field) + deltas[field] if deltas.get(field) else F(field) for field in ('like_count', 'dislike_count', 'comment_count'))
+    score = ExpressionWrapper(likes - dislikes + Value(HOT_COMMENT_WEIGHT) * comments + Value(1.0), output_field=FloatField())
+    order = Sign(score) * Log(Value(10.0), Greatest(Abs(score), Value(1.0)))
+    return ExpressionWrapper(order + (seconds - Value(HOT_EPOCH.timestamp())) / Value(float(HOT_DECAY_SECONDS)), output_field=FloatField())
+
+def hot_score_drifted(fresh):
+    return Q(hot_score__gt=fresh + Value(HOT_TOLERANCE)) | Q(hot_score__lt=fresh - Value(HOT_TOLERANCE))
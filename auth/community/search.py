@@ -0,0 +1,84 @@
+import re
+from django.db import connection
+from django.db.models import Q
+from .models import Post
+
+FTS_TABLE = 'community_post_fts'
+SEARCH_CONFIG = 'english'
+FTS_WEIGHTS = (10.0, 4.0, 2.0)
+
+def search_terms(query):
+    return re.findall(r'\w+', query)
+
+def tsquery(terms):
+    return ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+
+def fts5_query(terms):
+    return ' '.join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*'])
+
+def _scope(author_id, after, cast=''):
+    scope, params = '', []
+    if author_id is not None:
+        scope = " AND p.user_id = %s"
+        params.append(author_id)
+    keyset, keyset_params = '', []
+    if after:
+        keyset = f"WHERE rank < %s{cast} OR (rank = %s{cast} AND id < %s)"
+        keyset_params = [after[0], after[0], after[1]]
+    return scope, params, keyset, keyset_params
+
+def _postgres_hits(terms, author_id, after, limit):
+    scope, params, keyset, keyset_params = _scope(author_id, after, '::real')
+    sql = (
+        f"SELECT id, rank FROM ("
+        f"SELECT p.id, ts_rank(p.search_vector, tsq) AS rank "
+        f"FROM {Post._meta.db_table} p, to_tsquery(%s, %s) AS tsq "
+        f"WHERE p.search_vector @@ tsq{scope}"
+        f") AS hits {keyset} ORDER BY rank DESC, id DESC LIMIT %s"
+    )
+    return sql, [SEARCH_CONFIG, tsquery(terms)] + params + keyset_params + [limit]
+
+def _sqlite_hits(terms, author_id, after, limit):
+    scope, params, keyset, keyset_params = _scope(author_id, after)
+    weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+    sql = (
+        f"SELECT id, rank FROM ("
+        f"SELECT p.id AS id, -bm25({FTS_TABLE}, {weights}) AS rank "
+        f"FROM {FTS_TABLE} JOIN {Post._meta.db_table} p ON p.id = {FTS_TABLE}.rowid "
+        f"WHERE {FTS_TABLE} MATCH %s{scope}"
+        f") AS hits {keyset} ORDER BY rank DESC, id DESC LIMIT %s"
+    )
+    return sql, [fts5_query(terms)] + params + keyset_params + [limit]
+
+def _fallback_hits(query, author_id, after, limit):
+    posts = Post.objects.filter(Q(title__icontains=query) | Q(desc__icontains=query) | Q(loc__icontains=query))
+    if author_id is not None:
+        posts = posts.filter(user_id=author_id)
+    if after:
+        posts = posts.filter(id__lt=after[1])
+    return [(pk, 0.0) for pk in posts.order_by('-id').values_list('id', flat=True)[:limit]]
+
+def search_posts(query, limit, after=None, user=None, author_id=None):
+    terms = search_terms(query)
+    if not terms:
+        return []
+    if connection.vendor == 'postgresql':
+        sql, params = _postgres_hits(terms, author_id, after, limit)
+    elif connection.vendor == 'sqlite':
+        sql, params = _sqlite_hits(terms, author_id, after, limit)
+    else:
+        hits = _fallback_hits(query, author_id, after, limit)
+        sql = None
+    if sql is not None:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            hits = cursor.fetchall()
+    posts = Post.objects.feed(user).in_bulk([pk for pk, _ in hits])
+    results = []
+    for pk, rank in hits:
+        post = posts.get(pk)
+        if post is None:
+            continue
+        post.rank = float(rank)
+        results.append(post)
+    return results
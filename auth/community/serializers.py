@@ -1,21 +1,29 @@
+import re
+from django.conf import settings
 from rest_framework import serializers
-from .models import Post, Comment, PostLike
+from .models import Post, Comment, PostLike, VideoUpload
+from .pagination import CommentKeysetPagination
 from personal.models import Profile
+from imaging.serializers import ImageVariantsField
+
+VIDEO_MAX_SIZE = 100 * 1024 * 1024
+VIDEO_EXTENSIONS = ['mp4', 'mov', 'avi', 'mkv', 'webm']
 
 class PostSerializer(serializers.ModelSerializer):
     user = serializers.SerializerMethodField()
     img_url = serializers.SerializerMethodField()
     vid_url = serializers.SerializerMethodField()
-    likes = serializers.SerializerMethodField()
-    dislikes = serializers.SerializerMethodField()
-    total_comments = serializers.SerializerMethodField()
+    img_variants = ImageVariantsField()
+    likes = serializers.IntegerField(source='like_count', read_only=True)
+    dislikes = serializers.IntegerField(source='dislike_count', read_only=True)
+    total_comments = serializers.IntegerField(source='comment_count', read_only=True, help_text='Number of comments on the post, replies included')
     reaction = serializers.SerializerMethodField()
     owner = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
-        fields = ['id', 'user', 'title', 'desc', 'loc', 'rating', 'img', 'vid', 'img_url', 'vid_url', 'likes', 'dislikes', 'total_comments', 'reaction', 'owner', 'created', 'updated']
-        read_only_fields = ['id', 'created', 'updated']
+        fields = ['id', 'user', 'title', 'desc', 'loc', 'rating', 'img', 'vid', 'img_url', 'vid_url', 'img_variants', 'likes', 'dislikes', 'total_comments', 'reaction', 'owner', 'created', 'updated']
+        read_only_fields = ['id', 'vid', 'created', 'updated']
 
     def get_user(self, obj):
         if hasattr(obj.user, 'profile'):
@@ -38,19 +46,14 @@ class PostSerializer(serializers.ModelSerializer):
             return obj.vid.url
         return None
     
-    def get_likes(self, obj):
-        return obj.likes.filter(like=True).count()
-    
-    def get_dislikes(self, obj):
-        return obj.likes.filter(like=False).count()
-    
-    def get_total_comments(self, obj):
-        return obj.comments.count()
-
     def get_reaction(self, obj):
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return None
+        if hasattr(obj, 'user_liked'):
+            if obj.user_liked:
+                return "like"
+            return "dislike" if obj.user_disliked else None
         reaction = PostLike.objects.filter(post=obj, user=request.user).first()
         if reaction:
             return "like" if reaction.like else "dislike"       
@@ -84,21 +87,20 @@ class PostSerializer(serializers.ModelSerializer):
             if val.name.split('.')[-1].lower() not in ['jpg', 'jpeg', 'png', 'webp']:
                 raise serializers.ValidationError("Only JPG, JPEG, PNG, and WEBP formats are allowed")
         return val
-    
-    def validate_vid(self, val):
-        if val:
-            if val.size > 100 * 1024 * 1024:
-                raise serializers.ValidationError("Video size should not be more than 100MB")
-            if val.name.split('.')[-1].lower() not in ['mp4', 'mov', 'avi', 'mkv', 'webm']:
-                raise serializers.ValidationError("Only MP4, MOV, AVI, MKV, and WEBM formats are allowed")
-        return val
+
+class PostSearchResultSerializer(PostSerializer):
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(PostSerializer.Meta):
+        fields = PostSerializer.Meta.fields + ['rank']
 
 class UserMiniSerializer(serializers.ModelSerializer):
     uid = serializers.IntegerField(source='user.id', read_only=True)
     pic = serializers.SerializerMethodField()    
+    pic_variants = ImageVariantsField(source='profile_pic_variants')
     class Meta:
         model = Profile
-        fields = ['uid', 'fname', 'lname', 'pic']    
+        fields = ['uid', 'fname', 'lname', 'pic', 'pic_variants']    
     def get_pic(self, obj):
         if obj.profile_pic:
             req = self.context.get('request')
@@ -112,8 +114,8 @@ class CommentSerializer(serializers.ModelSerializer):
     owner = serializers.SerializerMethodField()
     class Meta:
         model = Comment
-        fields = ['id', 'post', 'user', 'text', 'owner', 'created', 'updated']
-        read_only_fields = ['id', 'post', 'created', 'updated']
+        fields = ['id', 'post', 'parent', 'depth', 'reply_count', 'user', 'text', 'owner', 'created', 'updated']
+        read_only_fields = ['id', 'post', 'depth', 'reply_count', 'created', 'updated']
     def get_user(self, obj):
         if hasattr(obj.user, 'profile'):
             return UserMiniSerializer(obj.user.profile, context=self.context).data
@@ -127,8 +129,57 @@ class CommentSerializer(serializers.ModelSerializer):
         if not val or not val.strip() or len(val.strip()) > 500:
             raise serializers.ValidationError("Comment must not be empty and cannot exceed 500 characters")
         return val.strip()
+    def validate_parent(self, val):
+        if self.instance is not None:
+            return self.instance.parent
+        post = self.context.get('post')
+        if val is not None and post is not None and val.post_id != post.pk:
+            raise serializers.ValidationError("You can only reply to a comment on the same post")
+        return val
+
+class CommentThreadSerializer(CommentSerializer):
+    replies = CommentSerializer(source='thread_replies', many=True, read_only=True)
+    class Meta(CommentSerializer.Meta):
+        fields = CommentSerializer.Meta.fields + ['replies']
 
 class PostDetailSerializer(PostSerializer):
-    comments = CommentSerializer(many=True, read_only=True)   
+    comments = serializers.SerializerMethodField()
+    comments_next = serializers.SerializerMethodField()
     class Meta(PostSerializer.Meta):
-        fields = PostSerializer.Meta.fields + ['comments']
\ No newline at end of file
+        fields = PostSerializer.Meta.fields + ['comments', 'comments_next']
+    def comment_page(self, obj):
+        if not hasattr(self, '_comment_page'):
+            paginator = CommentKeysetPagination()
+            comments = Comment.objects.filter(post=obj).select_related('user__profile')
+            page = comments.with_threads(paginator.paginate(comments.roots(), paginator.page_size), paginator.replies_per_thread)
+            self._comment_page = (page, paginator.encode_cursor(paginator.oldest) if paginator.has_more else None)
+        return self._comment_page
+    def get_comments(self, obj):
+        return CommentThreadSerializer(self.comment_page(obj)[0], many=True, context=self.context).data
+    def get_comments_next(self, obj):
+        return self.comment_page(obj)[1]
+
+class VideoUploadSerializer(serializers.ModelSerializer):
+    chunk_size = serializers.SerializerMethodField()
+    class Meta:
+        model = VideoUpload
+        fields = ['id', 'filename', 'size', 'checksum', 'offset', 'chunk_size', 'post', 'completed', 'created']
+        read_only_fields = ['id', 'offset', 'post', 'completed', 'created']
+    def get_chunk_size(self, obj):
+        return settings.CHUNKED_UPLOAD_CHUNK_SIZE
+    def validate_filename(self, val):
+        if val.split('.')[-1].lower() not in VIDEO_EXTENSIONS:
+            raise serializers.ValidationError("Only MP4, MOV, AVI, MKV, and WEBM formats are allowed")
+        return val
+    def validate_size(self, val):
+        if val < 1 or val > VIDEO_MAX_SIZE:
+            raise serializers.ValidationError("Video size should not be more than 100MB")
+        return val
+    def validate_checksum(self, val):
+        val = val.lower()
+        if val and not re.fullmatch(r'[0-9a-f]{64}', val):
+            raise serializers.ValidationError("Checksum must be a hex SHA-256 digest")
+        return val
+
+class VideoUploadCompleteSerializer(serializers.Serializer):
+    post = serializers.IntegerField(min_value=1, help_text="Post to attach the finished video to")
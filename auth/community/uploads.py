@@ -0,0 +1,80 @@
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+from django.conf import settings
+from django.core.files import File
+
+READ_SIZE = 64 * 1024
+
+class ChunkError(Exception):
+    pass
+
+def upload_dir():
+    path = getattr(settings, 'CHUNKED_UPLOAD_DIR')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def partial_path(upload):
+    return os.path.join(upload_dir(), f'{upload.pk}.part')
+
+def stage_chunk(upload, stream, length, checksum):
+    digest = hashlib.sha256()
+    fd, path = tempfile.mkstemp(dir=upload_dir(), prefix=f'{upload.pk}.', suffix='.chunk')
+    try:
+        with os.fdopen(fd, 'wb') as handle:
+            remaining = length
+            while remaining:
+                data = stream.read(min(READ_SIZE, remaining))
+                if not data:
+                    break
+                handle.write(data)
+                digest.update(data)
+                remaining -= len(data)
+            if remaining:
+                raise ChunkError('Chunk ended before Content-Length bytes were received')
+            if digest.hexdigest() != checksum:
+                raise ChunkError('Chunk checksum does not match X-Chunk-SHA256')
+    except BaseException:
+        remove_chunk(path)
+        raise
+    return path
+
+def append_chunk(upload, staged):
+    path = partial_path(upload)
+    with open(path, 'r+b' if os.path.exists(path) else 'w+b') as handle, open(staged, 'rb') as chunk:
+        handle.truncate(upload.offset)
+        handle.seek(upload.offset)
+        shutil.copyfileobj(chunk, handle, READ_SIZE)
+        handle.flush()
+        os.fsync(handle.fileno())
+    return upload.offset + os.path.getsize(staged)
+
+def remove_chunk(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def store_video(upload, post):
+    previous = post.vid.name
+    with open(partial_path(upload), 'rb') as handle:
+        post.vid.save(upload.filename, File(handle), save=False)
+    return previous
+
+def delete_video(post, name):
+    if name and name != post.vid.name:
+        post.vid.storage.delete(name)
+
+def discard(upload):
+    remove_chunk(partial_path(upload))
+    for path in glob.glob(os.path.join(upload_dir(), f'{upload.pk}.*.chunk')):
+        remove_chunk(path)
@@ -1,7 +1,7 @@
 from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import path
-from .views import (PostListView,PostCreateView,PostDetailView,PostUpdateView,PostDeleteView,PostSearchView,MyPostsView,CommentCreateView,CommentUpdateView,CommentDeleteView,PostLikeView)
+from .views import (PostListView,PostCreateView,PostDetailView,PostUpdateView,PostDeleteView,PostSearchView,MyPostsView,CommentCreateView,CommentRepliesView,CommentUpdateView,CommentDeleteView,PostLikeView,VideoUploadCreateView,VideoUploadDetailView,VideoUploadCompleteView)
 
 app_name = 'community'
 
@@ -14,7 +14,11 @@ urlpatterns = [
     path('posts/<int:pk>/update/', PostUpdateView.as_view(), name='post-update'),
     path('posts/<int:pk>/delete/', PostDeleteView.as_view(), name='post-delete'),
     path('posts/<int:pk>/comments/', CommentCreateView.as_view(), name='comment-create'),
+    path('comments/<int:pk>/replies/', CommentRepliesView.as_view(), name='comment-replies'),
     path('comments/<int:pk>/update/', CommentUpdateView.as_view(), name='comment-update'),
     path('comments/<int:pk>/delete/', CommentDeleteView.as_view(), name='comment-delete'),
     path('posts/<int:pk>/like/', PostLikeView.as_view(), name='post-like'),
+    path('posts/uploads/', VideoUploadCreateView.as_view(), name='upload-create'),
+    path('posts/uploads/<uuid:upload_id>/', VideoUploadDetailView.as_view(), name='upload-detail'),
+    path('posts/uploads/<uuid:upload_id>/complete/', VideoUploadCompleteView.as_view(), name='upload-complete'),
 ]
\ No newline at end of file
@@ -1,22 +1,38 @@
 from rest_framework.views import APIView
 from rest_framework import status, parsers
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, AllowAny
+from django.conf import settings
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiExample,OpenApiResponse
 from drf_spectacular.types import OpenApiTypes
-from .models import Post, Comment, PostLike
-from .serializers import PostSerializer, PostDetailSerializer, CommentSerializer
+from .models import Post, Comment, PostLike, VideoUpload
+from .serializers import PostSerializer, PostDetailSerializer, PostSearchResultSerializer, CommentSerializer, CommentThreadSerializer, VideoUploadSerializer, VideoUploadCompleteSerializer
+from .pagination import CommentKeysetPagination, CommentReplyPagination, PostHotPagination, PostKeysetPagination, PostSearchPagination
+from .search import search_posts
+from .uploads import ChunkError, append_chunk, delete_video, discard, file_checksum, partial_path, remove_chunk, stage_chunk, store_video
+
+PAGE_PARAMETERS = [
+    OpenApiParameter(name="before",type=OpenApiTypes.STR,location=OpenApiParameter.QUERY,description="Return results older than this cursor",required=False),
+    OpenApiParameter(name="after",type=OpenApiTypes.STR,location=OpenApiParameter.QUERY,description="Return results newer than this cursor",required=False),
+    OpenApiParameter(name="limit",type=OpenApiTypes.INT,location=OpenApiParameter.QUERY,description=f"Page size (max {PostKeysetPagination.max_page_size})",required=False),
+]
 
 class PostListView(APIView):
     permission_classes = [AllowAny]    
     @extend_schema(
     tags=["Posts"],
     summary="List all posts",
-    description=("Retrieve a list of all posts. "),
+    description=("Retrieve a page of posts, newest first, or with `sort=hot` by a time-decayed engagement score. Pass the returned `before` cursor to load the next page or `after` to load the previous one. "
+                 "With `search` the posts are ranked by relevance instead and only the `after` cursor is returned."),
     parameters=[
         OpenApiParameter(name="user",type=OpenApiTypes.INT,location=OpenApiParameter.QUERY,description="Filter by user ID",required=False),
-        OpenApiParameter(name="search",type=OpenApiTypes.STR,location=OpenApiParameter.QUERY,description="Search posts by title",required=False),
+        OpenApiParameter(name="search",type=OpenApiTypes.STR,location=OpenApiParameter.QUERY,description="Full-text search over title, description and location",required=False),
+        OpenApiParameter(name="sort",type=OpenApiTypes.STR,location=OpenApiParameter.QUERY,description="`new` (default) or `hot`",required=False,enum=['new', 'hot']),
+        *PAGE_PARAMETERS,
     ],
     responses={
         200: OpenApiResponse(
@@ -28,7 +44,10 @@ class PostListView(APIView):
                     summary="Example successful response",
                     value={
                         "status": "success",
-                        "count": 2,
+                        "has_more": True,
+                        "before": "MjAyNS0xMS0xM1QxMDowMDowMCswMDowMHwx",
+                        "after": "MjAyNS0xMS0xM1QxMjowMDowMCswMDowMHwy",
+                        "page_size": 2,
                         "data": [
                             {
                                 "id": 1,
@@ -50,18 +69,25 @@ class PostListView(APIView):
     },
     )
     def get(self, req):
-        posts = Post.objects.select_related('user__profile').all()        
+        posts = Post.objects.feed(req.user)
         uid = req.query_params.get('user')
+        author_id = None
         if uid:
             try:
-                posts = posts.filter(user__id=int(uid))
+                author_id = int(uid)
+                posts = posts.filter(user__id=author_id)
             except (ValueError, TypeError):
                 pass        
-        q = req.query_params.get('search')
+        q = req.query_params.get('search', '').strip()
         if q:
-            posts = posts.filter(title__icontains=q.strip())        
-        s = PostSerializer(posts, many=True, context={'request': req})
-        return Response({'status': 'success','count': posts.count(),'data': s.data})
+            paginator = PostSearchPagination()
+            page = paginator.paginate_search(lambda limit, after: search_posts(q, limit, after=after, user=req.user, author_id=author_id), req)
+            s = PostSearchResultSerializer(page, many=True, context={'request': req})
+            return paginator.get_paginated_response(s.data)
+        paginator = PostHotPagination() if req.query_params.get('sort') == 'hot' else PostKeysetPagination()
+        page = paginator.paginate_queryset(posts, req, self)
+        s = PostSerializer(page, many=True, context={'request': req})
+        return paginator.get_paginated_response(s.data)
     
 class PostCreateView(APIView):
     permission_classes = [IsAuthenticated]
@@ -69,7 +95,8 @@ class PostCreateView(APIView):
     @extend_schema(
         tags=["Posts"],
         summary="Create a new post",
-        description=("Allows an authenticated user to create a new post."),
+        description=("Allows an authenticated user to create a new post. Videos are not accepted here; "
+                     "send them through the resumable video upload endpoints and attach them with `complete`."),
         request=PostSerializer,
         responses={
             201: OpenApiResponse(
@@ -136,7 +163,7 @@ class PostDetailView(APIView):
     @extend_schema(
         tags=['Posts'],
         summary='Retrieve a single post',
-        description='Retrieve full details of a specific post using its ID, including user info and comments.',
+        description='Retrieve full details of a specific post using its ID, including user info and the newest page of comments. `total_comments` is the full count; load older comments from the comments endpoint with `before=comments_next`.',
         responses={
             200: OpenApiResponse(
                 description="Post details retrieved successfully",
@@ -153,10 +180,12 @@ class PostDetailView(APIView):
                                 "title": "Trip to Paris",
                                 "desc": "Visited the Eiffel Tower during my trip to Paris.",
                                 "user": {"id": 3, "name": "John Doe"},
+                                "total_comments": 42,
                                 "comments": [
-                                    {"id": 10, "text": "Looks great!", "user": {"id": 5, "name": "Alex"}},
-                                    {"id": 11, "text": "I want to go too!", "user": {"id": 6, "name": "Lara"}}
-                                ]
+                                    {"id": 11, "text": "I want to go too!", "user": {"id": 6, "name": "Lara"}},
+                                    {"id": 10, "text": "Looks great!", "user": {"id": 5, "name": "Alex"}}
+                                ],
+                                "comments_next": "MjAyNS0xMS0xM1QxMDowMDowMCswMDowMHwxMA=="
                             }
                         }
                     )
@@ -180,7 +209,7 @@ class PostDetailView(APIView):
         },
     )
     def get(self, req, pk):
-        p = get_object_or_404(Post.objects.select_related('user__profile').prefetch_related('comments__user__profile'),pk=pk)
+        p = get_object_or_404(Post.objects.feed(req.user),pk=pk)
         s = PostDetailSerializer(p, context={'request': req})
         return Response({'status': 'success','data': s.data})
 
@@ -190,7 +219,7 @@ class PostUpdateView(APIView):
     @extend_schema(
         tags=['Posts'],
         summary='Update an existing post',
-        description='Update your own post.',
+        description='Update your own post. To replace the video, use the resumable video upload endpoints.',
         request=PostSerializer,
         responses={
             200: OpenApiResponse(
@@ -326,8 +355,8 @@ class PostSearchView(APIView):
     permission_classes = [AllowAny]    
     @extend_schema(
         tags=['Posts'],
-        summary='Search posts by title',
-        description='Search for posts whose titles contain the given query string (case-insensitive).',
+        summary='Search posts',
+        description='Full-text search over post titles, descriptions and locations. Title matches weigh most, then description, then location, and the last word also matches as a prefix so partial input works for type-ahead. Results are ordered by relevance; pass the returned `after` cursor to load the next page.',
         parameters=[
             OpenApiParameter(
                 name='q',
@@ -336,11 +365,13 @@ class PostSearchView(APIView):
                 description='Search query string (e.g., "beach")',
                 required=True
             ),
+            OpenApiParameter(name="after",type=OpenApiTypes.STR,location=OpenApiParameter.QUERY,description="Return results ranked below this cursor",required=False),
+            OpenApiParameter(name="limit",type=OpenApiTypes.INT,location=OpenApiParameter.QUERY,description=f"Page size (max {PostSearchPagination.max_page_size})",required=False),
         ],
         responses={
             200: OpenApiResponse(
                 description="Successful search results",
-                response=PostSerializer(many=True),
+                response=PostSearchResultSerializer(many=True),
                 examples=[
                     OpenApiExample(
                         name='Search Response Example',
@@ -349,19 +380,23 @@ class PostSearchView(APIView):
                         value={
                             "status": "success",
                             "query": "mountain",
-                            "count": 2,
+                            "has_more": True,
+                            "after": "MC4wNjA3OTI3fDc=",
+                            "page_size": 2,
                             "data": [
                                 {
                                     "id": 4,
                                     "title": "Mountain Trekking",
                                     "desc": "Adventure in the Himalayas!",
-                                    "photo": "https://cdn.com/img4.jpg"
+                                    "photo": "https://cdn.com/img4.jpg",
+                                    "rank": 0.6079271
                                 },
                                 {
                                     "id": 7,
                                     "title": "Snowy Mountains",
                                     "desc": "Winter escape",
-                                    "photo": "https://cdn.com/img7.jpg"
+                                    "photo": "https://cdn.com/img7.jpg",
+                                    "rank": 0.0607927
                                 }
                             ]
                         }
@@ -397,16 +432,18 @@ class PostSearchView(APIView):
         q = req.query_params.get('q', '').strip()        
         if not q:
             return Response({'status': 'error','message': 'Search query is required','errors': {'query': ['Please provide a search query']}}, status=status.HTTP_400_BAD_REQUEST)        
-        posts = Post.objects.filter(title__icontains=q).select_related('user__profile')
-        s = PostSerializer(posts, many=True, context={'request': req})        
-        return Response({'status': 'success','query': q,'count': posts.count(),'data': s.data})
+        paginator = PostSearchPagination()
+        page = paginator.paginate_search(lambda limit, after: search_posts(q, limit, after=after, user=req.user), req)
+        s = PostSearchResultSerializer(page, many=True, context={'request': req})        
+        return paginator.get_paginated_response(s.data, query=q)
 
 class MyPostsView(APIView):
     permission_classes = [IsAuthenticated]    
     @extend_schema(
         tags=['Posts'],
         summary='List posts created by current user',
-        description='Retrieve all posts created by the authenticated user.',
+        description='Retrieve the posts created by the authenticated user, newest first, paginated with `before`/`after` cursors.',
+        parameters=PAGE_PARAMETERS,
         responses={
             200: OpenApiResponse(
                 description="Posts retrieved successfully",
@@ -417,8 +454,10 @@ class MyPostsView(APIView):
                         summary='My posts retrieved successfully',
                         value={
                             "status": "success",
-                            "message": "Posts retrieved successfully.",
-                            "count": 2,
+                            "has_more": False,
+                            "before": "MjAyNS0xMS0wOFQxODowMDowMCswMDowMHwxMA==",
+                            "after": "MjAyNS0xMS0xMVQxODowMDowMCswMDowMHwxMg==",
+                            "page_size": 2,
                             "data": [
                                 {"id": 10, "title": "Sunset in Bali", "desc": "Beautiful sunset!", "photo": "https://cdn.com/img10.jpg"},
                                 {"id": 12, "title": "Paris Vlog", "desc": "My travel vlog in Paris", "photo": "https://cdn.com/img12.jpg"}
@@ -430,16 +469,60 @@ class MyPostsView(APIView):
         }
     )
     def get(self, req):
-        posts = Post.objects.filter(user=req.user).select_related('user__profile')
-        s = PostSerializer(posts, many=True, context={'request': req})        
-        return Response({'status': 'success','count': posts.count(),'data': s.data})
+        posts = Post.objects.feed(req.user).filter(user=req.user)
+        paginator = PostKeysetPagination()
+        page = paginator.paginate_queryset(posts, req, self)
+        s = PostSerializer(page, many=True, context={'request': req})        
+        return paginator.get_paginated_response(s.data)
 
 class CommentCreateView(APIView):
-    permission_classes = [IsAuthenticated]    
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    @extend_schema(
+        tags=['Posts'],
+        summary='List comment threads on a post',
+        description='Retrieve a page of top-level comments on a post, newest first, each with its first replies in thread order. `total` counts every comment on the post, replies included. Pass the returned `before` cursor, or `comments_next` from the post detail, to load older threads.',
+        parameters=PAGE_PARAMETERS + [
+            OpenApiParameter(name="replies",type=OpenApiTypes.INT,location=OpenApiParameter.QUERY,description=f"Replies to embed per thread (max {CommentKeysetPagination.max_replies_per_thread})",required=False),
+        ],
+        responses={
+            200: OpenApiResponse(
+                description="Comments retrieved successfully",
+                response=OpenApiTypes.OBJECT,
+                examples=[
+                    OpenApiExample(
+                        name='Success Example',
+                        value={
+                            "status": "success",
+                            "total": 42,
+                            "has_more": True,
+                            "before": "MjAyNS0xMS0xMlQwOTowMDowMCswMDowMHw4",
+                            "after": "MjAyNS0xMS0xMlQwOTozMDowMCswMDowMHw5",
+                            "page_size": 2,
+                            "data": [
+                                {"id": 9, "post": 1, "parent": None, "depth": 0, "reply_count": 1, "text": "Which hotel did you stay at?", "owner": False, "created": "2025-11-12T09:30:00Z", "replies": [
+                                    {"id": 11, "post": 1, "parent": 9, "depth": 1, "reply_count": 0, "text": "The one by the lake", "owner": True, "created": "2025-11-12T09:40:00Z"}
+                                ]},
+                                {"id": 8, "post": 1, "parent": None, "depth": 0, "reply_count": 0, "text": "Stunning view!", "owner": False, "created": "2025-11-12T09:00:00Z", "replies": []}
+                            ]
+                        }
+                    )
+                ]
+            ),
+            404: OpenApiResponse(description="Post not found", response=OpenApiTypes.OBJECT),
+        }
+    )
+    def get(self, req, pk):
+        p = get_object_or_404(Post.objects.only('id', 'comment_count'), pk=pk)
+        paginator = CommentKeysetPagination()
+        comments = Comment.objects.filter(post=p).select_related('user__profile')
+        page = comments.with_threads(paginator.paginate_queryset(comments.roots(), req, self), paginator.get_replies_per_thread(req))
+        s = CommentThreadSerializer(page, many=True, context={'request': req})
+        return paginator.get_paginated_response(s.data, total=p.comment_count)
+
     @extend_schema(
         tags=['Posts'],
         summary='Add a comment to a post',
-        description='Authenticated users can post a comment under a specific post.',
+        description='Authenticated users can post a comment under a specific post. Pass `parent` to reply to another comment on the same post; replies nested deeper than the thread limit are attached to the parent\'s parent.',
         request=CommentSerializer,
         responses={
             201: OpenApiResponse(
@@ -520,11 +603,50 @@ class CommentCreateView(APIView):
     )
     def post(self, req, pk):
         p = get_object_or_404(Post, pk=pk)        
-        s = CommentSerializer(data=req.data, context={'request': req})
+        s = CommentSerializer(data=req.data, context={'request': req, 'post': p})
         s.is_valid(raise_exception=True)
         s.save(user=req.user, post=p)        
         return Response({'status': 'success','message': 'Comment added successfully','data': s.data}, status=status.HTTP_201_CREATED)
 
+class CommentRepliesView(APIView):
+    permission_classes = [AllowAny]
+    @extend_schema(
+        tags=['Posts'],
+        summary='List replies to a comment',
+        description='Retrieve the whole reply subtree of a comment in thread order, each reply carrying its `depth` and `parent`. Pass the returned `after` cursor to load the next replies.',
+        parameters=PAGE_PARAMETERS,
+        responses={
+            200: OpenApiResponse(
+                description="Replies retrieved successfully",
+                response=OpenApiTypes.OBJECT,
+                examples=[
+                    OpenApiExample(
+                        name='Success Example',
+                        value={
+                            "status": "success",
+                            "has_more": False,
+                            "before": "MDAwMDAwMDAwOTAwMDAwMDAwMTF8MTE=",
+                            "after": "MDAwMDAwMDAwOTAwMDAwMDAwMTEwMDAwMDAwMDEyfDEy",
+                            "page_size": 2,
+                            "data": [
+                                {"id": 11, "post": 1, "parent": 9, "depth": 1, "reply_count": 1, "text": "The one by the lake", "owner": False, "created": "2025-11-12T09:40:00Z"},
+                                {"id": 12, "post": 1, "parent": 11, "depth": 2, "reply_count": 0, "text": "Thanks!", "owner": True, "created": "2025-11-12T09:45:00Z"}
+                            ]
+                        }
+                    )
+                ]
+            ),
+            404: OpenApiResponse(description="Comment not found", response=OpenApiTypes.OBJECT),
+        }
+    )
+    def get(self, req, pk):
+        c = get_object_or_404(Comment.objects.only('id', 'post_id', 'path'), pk=pk)
+        paginator = CommentReplyPagination()
+        replies = Comment.objects.filter(post_id=c.post_id).subtree(c.path).select_related('user__profile')
+        page = paginator.paginate_replies(replies, c, req)
+        s = CommentSerializer(page, many=True, context={'request': req})
+        return paginator.get_paginated_response(s.data)
+
 class CommentUpdateView(APIView):
     permission_classes = [IsAuthenticated]   
     @extend_schema(
@@ -760,6 +882,7 @@ class PostLikeView(APIView):
                     )
                 ]
             ),
+            404: OpenApiResponse(description="Post not found", response=OpenApiTypes.OBJECT),
         },
         examples=[
             OpenApiExample(
@@ -775,15 +898,175 @@ class PostLikeView(APIView):
         like = req.data.get('like')        
         if like is None:
             return Response({'status': 'error','message': 'Invalid request','errors': {'like': ['This field is required. Use true for like, false for dislike']}}, status=status.HTTP_400_BAD_REQUEST)       
-        existing = PostLike.objects.filter(post=p, user=req.user).first()        
-        if existing:
-            if existing.like == like:
-                existing.delete()
-                return Response({'status': 'success','message': f'{"Like" if like else "Dislike"} removed','data': {'action': 'removed','like': like,'likes': p.likes.filter(like=True).count(),'dislikes': p.likes.filter(like=False).count()}})
-            else:
-                existing.like = like
-                existing.save()
-                return Response({'status': 'success','message': f'Changed to {"like" if like else "dislike"}','data': {'action': 'updated','like': like,'likes': p.likes.filter(like=True).count(),'dislikes': p.likes.filter(like=False).count()}})
-        else:
-            PostLike.objects.create(post=p, user=req.user, like=like)
-            return Response({'status': 'success','message': f'Post {"liked" if like else "disliked"}','data': {'action': 'created','like': like,'likes': p.likes.filter(like=True).count(),'dislikes': p.likes.filter(like=False).count()}}, status=status.HTTP_201_CREATED)
\ No newline at end of file
+        try:
+            action, counts = PostLike.objects.toggle(p.pk, req.user, like)
+        except Post.DoesNotExist:
+            raise NotFound('Post not found')
+        data = {'action': action,'like': like,'likes': counts['like_count'],'dislikes': counts['dislike_count']}
+        if action == 'removed':
+            return Response({'status': 'success','message': f'{"Like" if like else "Dislike"} removed','data': data})
+        if action == 'updated':
+            return Response({'status': 'success','message': f'Changed to {"like" if like else "dislike"}','data': data})
+        return Response({'status': 'success','message': f'Post {"liked" if like else "disliked"}','data': data}, status=status.HTTP_201_CREATED)
+
+class VideoUploadCreateView(APIView):
+    permission_classes = [IsAuthenticated]
+    @extend_schema(
+        tags=['Posts'],
+        summary='Start a resumable video upload',
+        description=('Declare a video upload before sending it in chunks. Send each chunk to the returned upload with PATCH, '
+                     'then attach the finished file to a post with `complete`. `checksum` is the optional SHA-256 of the whole file.'),
+        request=VideoUploadSerializer,
+        responses={
+            201: OpenApiResponse(
+                description="Upload started",
+                response=OpenApiTypes.OBJECT,
+                examples=[
+                    OpenApiExample(
+                        name='Success Example',
+                        value={
+                            "status": "success",
+                            "message": "Upload started",
+                            "data": {"id": "5b0c2f4e-8a51-4f7e-9f0a-3f1d2c7b9e11", "filename": "goa.mp4", "size": 52428800, "checksum": "", "offset": 0, "chunk_size": 5242880, "post": None, "completed": None, "created": "2025-11-13T10:00:00Z"}
+                        }
+                    )
+                ]
+            ),
+            400: OpenApiResponse(description="Invalid file name or size", response=OpenApiTypes.OBJECT),
+        }
+    )
+    def post(self, req):
+        s = VideoUploadSerializer(data=req.data, context={'request': req})
+        s.is_valid(raise_exception=True)
+        s.save(user=req.user)
+        return Response({'status': 'success','message': 'Upload started','data': s.data}, status=status.HTTP_201_CREATED)
+
+class VideoUploadDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+    def get_upload(self, req, upload_id):
+        return get_object_or_404(VideoUpload, pk=upload_id, user=req.user, completed__isnull=True)
+
+    @extend_schema(
+        tags=['Posts'],
+        summary='Get upload progress',
+        description='Return how many bytes of the upload have been stored. After a disconnect, resume by sending the next chunk from `offset`.',
+        responses={200: OpenApiResponse(description="Upload progress", response=OpenApiTypes.OBJECT), 404: OpenApiResponse(description="Upload not found", response=OpenApiTypes.OBJECT)}
+    )
+    def get(self, req, upload_id):
+        upload = self.get_upload(req, upload_id)
+        return Response({'status': 'success','data': VideoUploadSerializer(upload).data})
+
+    @extend_schema(
+        tags=['Posts'],
+        summary='Append a chunk to an upload',
+        description=('Send the next chunk as the raw `application/octet-stream` request body. `Upload-Offset` must equal the current offset. '
+                     '`X-Chunk-SHA256` is the hex SHA-256 of the chunk. A chunk that is cut short or fails its checksum is discarded, '
+                     'and the offset stays where it was.'),
+        parameters=[
+            OpenApiParameter(name='Upload-Offset', type=OpenApiTypes.INT, location=OpenApiParameter.HEADER, required=True, description='Byte offset this chunk starts at'),
+            OpenApiParameter(name='X-Chunk-SHA256', type=OpenApiTypes.STR, location=OpenApiParameter.HEADER, required=True, description='Hex SHA-256 of the chunk body'),
+        ],
+        request={'application/octet-stream': OpenApiTypes.BINARY},
+        responses={
+            200: OpenApiResponse(
+                description="Chunk stored",
+                response=OpenApiTypes.OBJECT,
+                examples=[OpenApiExample(name='Success Example', value={"status": "success","message": "Chunk stored","data": {"offset": 5242880, "size": 52428800}})]
+            ),
+            400: OpenApiResponse(description="Incomplete chunk or checksum mismatch", response=OpenApiTypes.OBJECT),
+            409: OpenApiResponse(
+                description="Offset does not match the stored offset",
+                response=OpenApiTypes.OBJECT,
+                examples=[OpenApiExample(name='Offset Conflict', value={"status": "error","message": "Offset mismatch","errors": {"offset": ["Upload is at offset 5242880"]},"data": {"offset": 5242880}})]
+            ),
+            413: OpenApiResponse(description="Chunk too large", response=OpenApiTypes.OBJECT),
+        }
+    )
+    def patch(self, req, upload_id):
+        try:
+            offset = int(req.headers.get('Upload-Offset', ''))
+            length = int(req.headers.get('Content-Length', ''))
+        except ValueError:
+            return Response({'status': 'error','message': 'Invalid request','errors': {'headers': ['Upload-Offset and Content-Length are required']}}, status=status.HTTP_400_BAD_REQUEST)
+        checksum = req.headers.get('X-Chunk-SHA256', '').lower()
+        if not checksum:
+            return Response({'status': 'error','message': 'Invalid request','errors': {'checksum': ['X-Chunk-SHA256 is required']}}, status=status.HTTP_400_BAD_REQUEST)
+        if length < 1 or length > settings.CHUNKED_UPLOAD_CHUNK_SIZE:
+            return Response({'status': 'error','message': 'Chunk too large','errors': {'chunk': [f'Chunks must be between 1 and {settings.CHUNKED_UPLOAD_CHUNK_SIZE} bytes']}}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        upload = get_object_or_404(VideoUpload, pk=upload_id, user=req.user, completed__isnull=True)
+        if offset != upload.offset:
+            return Response({'status': 'error','message': 'Offset mismatch','errors': {'offset': [f'Upload is at offset {upload.offset}']},'data': {'offset': upload.offset}}, status=status.HTTP_409_CONFLICT)
+        if offset + length > upload.size:
+            return Response({'status': 'error','message': 'Chunk too large','errors': {'chunk': ['Chunk extends past the declared upload size']}}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        try:
+            staged = stage_chunk(upload, req.stream, length, checksum)
+        except ChunkError as e:
+            return Response({'status': 'error','message': 'Chunk rejected','errors': {'chunk': [str(e)]},'data': {'offset': upload.offset}}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            with transaction.atomic():
+                upload = get_object_or_404(VideoUpload.objects.select_for_update(), pk=upload_id, user=req.user, completed__isnull=True)
+                if offset != upload.offset:
+                    return Response({'status': 'error','message': 'Offset mismatch','errors': {'offset': [f'Upload is at offset {upload.offset}']},'data': {'offset': upload.offset}}, status=status.HTTP_409_CONFLICT)
+                upload.offset = append_chunk(upload, staged)
+                upload.save(update_fields=['offset', 'updated'])
+        finally:
+            remove_chunk(staged)
+        return Response({'status': 'success','message': 'Chunk stored','data': {'offset': upload.offset, 'size': upload.size}})
+
+    @extend_schema(
+        tags=['Posts'],
+        summary='Cancel an upload',
+        description='Discard an unfinished upload and the bytes stored so far.',
+        responses={200: OpenApiResponse(description="Upload cancelled", response=OpenApiTypes.OBJECT), 404: OpenApiResponse(description="Upload not found", response=OpenApiTypes.OBJECT)}
+    )
+    def delete(self, req, upload_id):
+        upload = self.get_upload(req, upload_id)
+        discard(upload)
+        upload.delete()
+        return Response({'status': 'success','message': 'Upload cancelled'})
+
+class VideoUploadCompleteView(APIView):
+    permission_classes = [IsAuthenticated]
+    @extend_schema(
+        tags=['Posts'],
+        summary='Finish an upload and attach it to a post',
+        description="Check that every byte has arrived and that the whole-file checksum matches, if one was declared. The video then becomes the `vid` of one of your posts.",
+        request=VideoUploadCompleteSerializer,
+        responses={
+            200: OpenApiResponse(
+                description="Video attached",
+                response=OpenApiTypes.OBJECT,
+                examples=[OpenApiExample(name='Success Example', value={"status": "success","message": "Video attached to post","data": {"id": 5, "title": "Sunset at Bali", "vid_url": "https://cdn.com/videos/goa.mp4"}})]
+            ),
+            400: OpenApiResponse(description="Upload incomplete or checksum mismatch", response=OpenApiTypes.OBJECT),
+            403: OpenApiResponse(description="Post belongs to another user", response=OpenApiTypes.OBJECT),
+            404: OpenApiResponse(description="Upload or post not found", response=OpenApiTypes.OBJECT),
+        }
+    )
+    def post(self, req, upload_id):
+        s = VideoUploadCompleteSerializer(data=req.data)
+        s.is_valid(raise_exception=True)
+        p = get_object_or_404(Post, pk=s.validated_data['post'])
+        if p.user != req.user:
+            return Response({'status': 'error','message': 'Permission denied','errors': {'permission': ['You can only attach videos to your own posts']}}, status=status.HTTP_403_FORBIDDEN)
+        upload = get_object_or_404(VideoUpload, pk=upload_id, user=req.user, completed__isnull=True)
+        if upload.offset != upload.size:
+            return Response({'status': 'error','message': 'Upload incomplete','errors': {'offset': [f'Received {upload.offset} of {upload.size} bytes']},'data': {'offset': upload.offset}}, status=status.HTTP_400_BAD_REQUEST)
+        if upload.checksum and file_checksum(partial_path(upload)) != upload.checksum:
+            return Response({'status': 'error','message': 'Checksum mismatch','errors': {'checksum': ['The uploaded file does not match the declared checksum']}}, status=status.HTTP_400_BAD_REQUEST)
+        previous = store_video(upload, p)
+        try:
+            with transaction.atomic():
+                now = timezone.now()
+                claimed = VideoUpload.objects.filter(pk=upload.pk, completed__isnull=True).update(post=p, completed=now, updated=now)
+                if claimed:
+                    p.save(update_fields=['vid', 'updated'])
+                    transaction.on_commit(lambda: discard(upload))
+                    transaction.on_commit(lambda: delete_video(p, previous))
+        except Exception:
+            p.vid.storage.delete(p.vid.name)
+            raise
+        if not claimed:
+            p.vid.storage.delete(p.vid.name)
+            return Response({'status': 'error','message': 'Upload not found','errors': {'upload': ['This upload was already completed or cancelled']}}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'status': 'success','message': 'Video attached to post','data': PostSerializer(p, context={'request': req}).data})
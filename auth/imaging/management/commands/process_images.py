@@ -0,0 +1,44 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from imaging.mixins import ImageVariantsMixin
+from imaging.tasks import process_image, variants_column
+
+class Command(BaseCommand):
+    help = 'Render resized image variants for uploads that have not been processed yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', action='append', help='Only process this model, e.g. community.Post (repeatable)')
+        parser.add_argument('--force', action='store_true', help='Re-render variants that already exist')
+        parser.add_argument('--batch-size', type=int, default=100, help='Rows loaded per query')
+
+    def handle(self, *args, **options):
+        models = [model for model in apps.get_models() if issubclass(model, ImageVariantsMixin)]
+        if options['model']:
+            labels = {label.lower() for label in options['model']}
+            unknown = labels - {model._meta.label_lower for model in models}
+            if unknown:
+                raise CommandError(f'No image variants on: {", ".join(sorted(unknown))}')
+            models = [model for model in models if model._meta.label_lower in labels]
+        processed = failed = 0
+        for model in models:
+            for field in model.variant_fields:
+                rows = model._default_manager.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                if not options['force']:
+                    rows = rows.filter(**{f'{variants_column(field)}__isnull': True})
+                last_pk = None
+                while True:
+                    batch = rows.order_by('pk')
+                    if last_pk is not None:
+                        batch = batch.filter(pk__gt=last_pk)
+                    batch = list(batch.values_list('pk', field)[:options['batch_size']])
+                    if not batch:
+                        break
+                    last_pk = batch[-1][0]
+                    for pk, name in batch:
+                        try:
+                            process_image(model._meta.label, pk, field, name, force=options['force'])
+                            processed += 1
+                        except Exception as e:
+                            failed += 1
+                            self.stderr.write(f'{model._meta.label} {pk} {field}: {e}')
+        self.stdout.write(self.style.SUCCESS(f'{processed} images processed, {failed} failed'))
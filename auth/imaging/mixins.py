@@ -0,0 +1,33 @@
+from .tasks import schedule_variants, variants_column
+
+class ImageVariantsMixin:
+    variant_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_variant_sources()
+        return instance
+
+    def remember_variant_sources(self):
+        deferred = self.get_deferred_fields()
+        self._variant_sources = {field: getattr(self, field).name for field in self.variant_fields if field not in deferred}
+
+    def changed_images(self):
+        sources = getattr(self, '_variant_sources', {})
+        return [field for field in self.variant_fields if field in sources and getattr(self, field).name != sources[field]]
+
+    def maintained_fields(self):
+        return {variants_column(field) for field in self.changed_images()}
+
+    def save(self, *args, **kwargs):
+        maintained = set() if self._state.adding else self.maintained_fields()
+        if maintained and not args and kwargs.get('update_fields') is None:
+            skipped = maintained | self.get_deferred_fields()
+            kwargs['update_fields'] = [f.name for f in self._meta.concrete_fields if not f.primary_key and f.name not in skipped and f.attname not in skipped]
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        for field in self.variant_fields:
+            if update_fields is None or field in update_fields:
+                schedule_variants(self, field)
+        self.remember_variant_sources()
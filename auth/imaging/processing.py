@@ -0,0 +1,81 @@
+import posixpath
+from io import BytesIO
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import ExifTags, Image, ImageOps
+
+VARIANTS = (('thumb', 320), ('card', 720), ('full', 1600))
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+VARIANT_PREFIX = 'variants'
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+def variant_base(name):
+    return posixpath.join(VARIANT_PREFIX, posixpath.splitext(name)[0])
+
+def normalize(image):
+    if image.mode in ('RGB', 'RGBA'):
+        return image
+    if image.mode in ('LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info):
+        return image.convert('RGBA')
+    return image.convert('RGB')
+
+def flatten(image):
+    if image.mode != 'RGBA':
+        return image
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+def encode(image, fmt, options, icc_profile):
+    if fmt == 'JPEG':
+        image = flatten(image)
+    buffer = BytesIO()
+    if icc_profile:
+        options = {**options, 'icc_profile': icc_profile}
+    image.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+def render_variants(field_file):
+    largest = max(size for _, size in VARIANTS)
+    field_file.open('rb')
+    try:
+        with Image.open(field_file) as source:
+            width, height = source.size
+            if source.getexif().get(ExifTags.Base.Orientation) in TRANSPOSED_ORIENTATIONS:
+                width, height = height, width
+            source.draft('RGB', (largest, largest))
+            icc_profile = source.info.get('icc_profile')
+            image = normalize(ImageOps.exif_transpose(source))
+    finally:
+        field_file.close()
+    base = variant_base(field_file.name)
+    data = {'source': field_file.name, 'width': width, 'height': height, 'variants': {}}
+    saved = []
+    try:
+        for name, size in VARIANTS:
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+            variant = {'width': resized.width, 'height': resized.height}
+            for ext, fmt, options in FORMATS:
+                path = default_storage.save(f'{base}/{name}.{ext}', ContentFile(encode(resized, fmt, options, icc_profile)))
+                saved.append(path)
+                variant[ext] = path
+            data['variants'][name] = variant
+    except Exception:
+        for path in saved:
+            default_storage.delete(path)
+        raise
+    return data
+
+def variant_paths(data):
+    for variant in (data or {}).get('variants', {}).values():
+        for ext, _, _ in FORMATS:
+            if variant.get(ext):
+                yield variant[ext]
+
+def delete_variant_files(data):
+    for path in variant_paths(data):
+        default_storage.delete(path)
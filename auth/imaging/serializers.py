@@ -0,0 +1,29 @@
+from django.core.files.storage import default_storage
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
+from rest_framework import serializers
+from .processing import FORMATS
+
+@extend_schema_field(OpenApiTypes.OBJECT)
+class ImageVariantsField(serializers.ReadOnlyField):
+    def url(self, path):
+        url = default_storage.url(path)
+        request = self.context.get('request')
+        if request:
+            return request.build_absolute_uri(url)
+        return url
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        data = {'width': value['width'], 'height': value['height']}
+        srcset = {}
+        for name, variant in value['variants'].items():
+            entry = {'width': variant['width'], 'height': variant['height']}
+            for ext, _, _ in FORMATS:
+                if variant.get(ext):
+                    entry[ext] = self.url(variant[ext])
+                    srcset.setdefault(ext, {}).setdefault(variant['width'], entry[ext])
+            data[name] = entry
+        data['srcset'] = {ext: ', '.join(f'{url} {width}w' for width, url in sorted(urls.items())) for ext, urls in srcset.items()}
+        return data
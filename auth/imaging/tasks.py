@@ -0,0 +1,69 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from .processing import delete_variant_files, render_variants
+
+logger = logging.getLogger(__name__)
+
+_executors = {}
+
+def image_workers():
+    return getattr(settings, 'IMAGE_WORKERS', 2)
+
+def image_executor(workers):
+    executor = _executors.get(workers)
+    if executor is None:
+        executor = _executors[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='imaging')
+    return executor
+
+def variants_column(field):
+    return f'{field}_variants'
+
+def process_image(model_label, pk, field, name, force=False):
+    model = apps.get_model(model_label)
+    column = variants_column(field)
+    instance = model.objects.filter(pk=pk, **{field: name}).only('pk', field, column).first()
+    if instance is None:
+        return None
+    previous = getattr(instance, column)
+    if previous and previous.get('source') == name and not force:
+        return previous
+    data = render_variants(getattr(instance, field))
+    if not model.objects.filter(pk=pk, **{field: name}).update(**{column: data}):
+        delete_variant_files(data)
+        return None
+    if previous:
+        delete_variant_files(previous)
+    return data
+
+def run_in_worker(model_label, pk, field, name):
+    close_old_connections()
+    try:
+        process_image(model_label, pk, field, name)
+    except Exception as e:
+        logger.error(f"Failed to process {model_label}.{field} image {name} for {pk}: {e}", exc_info=True)
+    finally:
+        close_old_connections()
+
+def submit(model_label, pk, field, name):
+    workers = image_workers()
+    if workers <= 0:
+        return run_in_worker(model_label, pk, field, name)
+    image_executor(workers).submit(run_in_worker, model_label, pk, field, name)
+
+def schedule_variants(instance, field):
+    image = getattr(instance, field)
+    column = variants_column(field)
+    variants = getattr(instance, column)
+    if not image:
+        if variants is not None:
+            type(instance)._default_manager.filter(pk=instance.pk).update(**{column: None})
+            setattr(instance, column, None)
+            transaction.on_commit(lambda: delete_variant_files(variants))
+        return
+    if variants and variants.get('source') == image.name:
+        return
+    label, pk, name = instance._meta.label, instance.pk, image.name
+    transaction.on_commit(lambda: submit(label, pk, field, name))
@@ -6,8 +6,9 @@ from django.core.exceptions import ValidationError
 from datetime import timedelta
 import random
 import hashlib
+from imaging.mixins import ImageVariantsMixin
 
-class Profile(models.Model):
+class Profile(ImageVariantsMixin, models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='profile')
     fname = models.CharField(max_length=100, default='')
     lname = models.CharField(max_length=100, default='')
@@ -17,6 +18,7 @@ class Profile(models.Model):
     gender = models.CharField(max_length=10,choices=[('male', 'Male'), ('female', 'Female'), ('other', 'Other'),],blank=False,default='other')
     bio = models.TextField(max_length=500, blank=False, default='')
     profile_pic = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+    profile_pic_variants = models.JSONField(blank=True, null=True, editable=False)
     bgroup = models.CharField(max_length=3,choices=[('A+', 'A+'),('A-', 'A-'),('B+', 'B+'),('B-', 'B-'),('AB+', 'AB+'),('AB-', 'AB-'),('O+', 'O+'),('O-', 'O-'),],blank=False,default='O+')
     allergies = models.TextField(max_length=200, blank=True, default='')
     medical = models.TextField(max_length=500, blank=True, default='')
@@ -31,6 +33,7 @@ class Profile(models.Model):
     otp_exp = models.DateTimeField(blank=True, null=True)
     otp_attempts = models.IntegerField(default=0)
     otp_locked_until = models.DateTimeField(blank=True, null=True)
+    variant_fields = ('profile_pic',)
 
     def _hash_otp(self, otp_code):
         return hashlib.sha256(otp_code.encode()).hexdigest()
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Profile
+from imaging.serializers import ImageVariantsField
 from django.contrib.auth import get_user_model
 from datetime import date, timedelta
 import re
@@ -8,11 +9,12 @@ User = get_user_model()
 
 class ProfileSerializer(serializers.ModelSerializer):
     profile_pic_url = serializers.SerializerMethodField()
+    profile_pic_variants = ImageVariantsField()
     email = serializers.EmailField(source='user.email', read_only=True)
     id = serializers.IntegerField(source='user.id', read_only=True)
     class Meta:
         model = Profile
-        fields = ['id', 'email', 'fname', 'lname', 'phone_number', 'is_phone_verified','date', 'gender', 'bio', 'profile_pic', 'profile_pic_url','bgroup', 'allergies', 'medical', 'ename', 'enumber', 'erelation','prefrence', 'created_at', 'updated_at']
+        fields = ['id', 'email', 'fname', 'lname', 'phone_number', 'is_phone_verified','date', 'gender', 'bio', 'profile_pic', 'profile_pic_url', 'profile_pic_variants','bgroup', 'allergies', 'medical', 'ename', 'enumber', 'erelation','prefrence', 'created_at', 'updated_at']
         read_only_fields = ['id', 'email', 'is_phone_verified', 'created_at', 'updated_at']
     def get_profile_pic_url(self, obj):
         if obj.profile_pic:
@@ -194,10 +196,11 @@ class UserProfileDetailSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(source='user.id', read_only=True)
     email = serializers.EmailField(source='user.email', read_only=True)
     profile_pic_url = serializers.SerializerMethodField()
+    profile_pic_variants = ImageVariantsField()
     
     class Meta:
         model = Profile
-        fields = ['id', 'email', 'fname', 'lname', 'phone_number', 'date', 'gender', 'bio', 'profile_pic_url','bgroup', 'allergies', 'medical', 'ename', 'enumber', 'erelation', 'prefrence']
+        fields = ['id', 'email', 'fname', 'lname', 'phone_number', 'date', 'gender', 'bio', 'profile_pic_url', 'profile_pic_variants','bgroup', 'allergies', 'medical', 'ename', 'enumber', 'erelation', 'prefrence']
         read_only_fields = fields
     def get_profile_pic_url(self, obj):
         if obj.profile_pic:
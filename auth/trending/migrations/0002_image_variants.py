@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trending', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='funfact',
+            name='photo_variants',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='trendingplace',
+            name='main_variants',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
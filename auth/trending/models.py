@@ -1,18 +1,23 @@
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
+from imaging.mixins import ImageVariantsMixin
 
-class TrendingPlace(models.Model):
+class TrendingPlace(ImageVariantsMixin, models.Model):
     name = models.CharField(max_length=200)
     main = models.ImageField(upload_to='places/')
+    main_variants = models.JSONField(blank=True, null=True, editable=False)
+    variant_fields = ('main',)
     def __str__(self):
         return self.name
 
-class FunFact(models.Model):
+class FunFact(ImageVariantsMixin, models.Model):
     place = models.ForeignKey(TrendingPlace, on_delete=models.CASCADE, related_name='fun_facts')
     slide = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(10)])
     title = models.CharField(max_length=100)
     desc = models.TextField(max_length=1500)
     photo = models.ImageField(upload_to='funfacts/')
+    photo_variants = models.JSONField(blank=True, null=True, editable=False)
+    variant_fields = ('photo',)
     class Meta:
         ordering = ['slide']
         unique_together = ['place', 'slide']
@@ -1,16 +1,19 @@
 from rest_framework import serializers
 from .models import TrendingPlace, FunFact
+from imaging.serializers import ImageVariantsField
 
 class FunFactSerializer(serializers.ModelSerializer):
+    photo_variants = ImageVariantsField()
     class Meta:
         model = FunFact
-        fields = ['id', 'slide', 'title', 'desc', 'photo']
+        fields = ['id', 'slide', 'title', 'desc', 'photo', 'photo_variants']
 
 class TrendingPlaceSerializer(serializers.ModelSerializer):
     fun_facts = FunFactSerializer(many=True, read_only=True)
+    main_variants = ImageVariantsField()
     class Meta:
         model = TrendingPlace
-        fields = ['id', 'name', 'main', 'fun_facts']
+        fields = ['id', 'name', 'main', 'main_variants', 'fun_facts']
 
 class TrendingPlaceCreateSerializer(serializers.ModelSerializer):
     class Meta: